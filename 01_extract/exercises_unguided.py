@@ -25,6 +25,28 @@
 import pandas as pd 
 import glob 
 import requests 
+import os
+import csv
+import json
+import hashlib
+import mmap
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+try:
+    import pyarrow as pa
+    import pyarrow.json as pa_json
+except ImportError:
+    pa = pa_json = None
 
 
 # EXERCISE 1 - READ AND EXPLORE A CSV
@@ -106,6 +128,92 @@ df_api_sample.head()
 df_api_sample.shape
 df_api_sample.isnull().sum()
 
+# Extra (optional):
+# - Our API dumps are multi-GB JSON Lines files, and read_json(lines=True)
+#   decodes the whole file into Python objects first.
+# - Create load_jsonl(path, max_workers) that:
+#   * memory-maps the file and splits it into byte ranges that end on a
+#     newline, so no record is cut in half
+#   * parses the ranges in parallel with a fast JSON decoder
+#   * turns every range straight into columns (no list of dicts)
+
+MIN_RANGE_BYTES = 16 * 1024 * 1024
+
+
+def jsonl_ranges(path, parts):
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+
+    bounds = [0]
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for i in range(1, parts):
+            position = size * i // parts
+            if position < bounds[-1]:
+                continue
+            newline = mm.find(b"\n", position)
+            if newline == -1:
+                break
+            bounds.append(newline + 1)
+
+    if bounds[-1] != size:
+        bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def parse_jsonl_range(path, start, end):
+    # pyarrow parses the mapped bytes straight into an Arrow table
+    if pa_json is not None:
+        with pa.memory_map(path) as source:
+            source.seek(start)
+            buffer = source.read_buffer(end - start)
+            options = pa_json.ReadOptions(use_threads=False)
+            return pa_json.read_json(pa.BufferReader(buffer), read_options=options)
+
+    # Fallback: decode line by line and append every value to its column
+    columns = {}
+    rows = 0
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        mm.seek(start)
+        while mm.tell() < end:
+            line = mm.readline()
+            if not line.strip():
+                continue
+            for key, value in json_loads(line).items():
+                if key not in columns:
+                    columns[key] = [None] * rows
+                columns[key].append(value)
+            rows += 1
+            for column in columns.values():
+                if len(column) < rows:
+                    column.append(None)
+
+    return pd.DataFrame(columns)
+
+
+def load_jsonl(path, max_workers=None):
+    max_workers = max_workers or os.cpu_count() or 1
+    parts = max(1, min(max_workers, os.path.getsize(path) // MIN_RANGE_BYTES))
+    ranges = jsonl_ranges(path, parts)
+
+    if len(ranges) <= 1:
+        batches = [parse_jsonl_range(path, start, end) for start, end in ranges]
+    else:
+        if "fork" in multiprocessing.get_all_start_methods():
+            executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("fork"))
+        else:
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        with executor:
+            batches = list(executor.map(parse_jsonl_range, [path] * len(ranges),
+                                        [start for start, _ in ranges], [end for _, end in ranges]))
+
+    if not batches:
+        return pd.DataFrame()
+    if pa_json is not None:
+        return pa.concat_tables(batches, promote_options="permissive").to_pandas()
+    return pd.concat(batches, ignore_index=True)
+
 
 # EXERCISE 5 - FUNCTION TO READ CSV
 
@@ -118,10 +226,12 @@ df_api_sample.isnull().sum()
 # Extra (optional):
 # - Add error handling with try/except and a friendly print
 #   if the file does not exist.
+# - Accept an optional chunksize. When it is given, return an iterator
+#   of DataFrames with that many rows instead of reading the whole file.
 
-def load_csv(path):
+def load_csv(path, chunksize=None):
     try:
-        file = pd.read_csv(path)
+        file = pd.read_csv(path, chunksize=chunksize)
         return file 
     except:
         print("Ha ocurrido un error , vuelve a intentarlo")
@@ -140,23 +250,139 @@ def load_csv(path):
 #
 # Note:
 # - You can reuse load_csv() if you created it in exercise 5.
+#
+# Extra (optional):
+# - Our landing folder receives thousands of files a day. Make the
+#   function scale:
+#   * Check each file's header against a schema (column -> dtype) before
+#     parsing it, and skip the files that do not match.
+#   * Remember each file's mtime, size and content hash in a manifest, and
+#     skip files that did not change since the last run.
+#   * Parse the files in parallel with a process pool.
+#   * Read with the schema dtypes so every DataFrame has the same types,
+#     and concatenate only once at the end.
+
+USERS_SCHEMA = {
+    "id": "int64",
+    "name": "string",
+    "email": "string",
+    "age": "Int64",
+}
+
+
+def read_header(path):
+    try:
+        with open(path, newline="", encoding="utf-8") as f:
+            return next(csv.reader(f), [])
+    except UnicodeDecodeError:
+        return None
 
-def load_all_csv_from_data():
-    files = glob.glob("01_extract/data/*.csv")  # 1. Search CSVs
-    dataframes = []                             # Empty list
 
-    for file in files:                          # 2. Iterate one by one
-        df = load_csv(file)                     # Read CSV
-        if df is not None:                      # Avoid errors
-            dataframes.append(df)               # Save DataFrame
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
-    # 3. Combine all into a single DataFrame
-    if dataframes:
-        return pd.concat(dataframes, ignore_index=True)
+
+def load_manifest(manifest_path):
+    if manifest_path and os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(manifest, manifest_path):
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def is_unchanged(path, manifest):
+    entry = manifest.get(path)
+    if entry is None:
+        return False
+
+    stat = os.stat(path)
+    if entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+        return True
+
+    # Touched but maybe not modified: compare the content
+    if entry["size"] == stat.st_size and entry["sha256"] == file_hash(path):
+        entry["mtime"] = stat.st_mtime
+        return True
+
+    return False
+
+
+def parse_csv_file(path, dtypes=None):
+    if dtypes is None:
+        return load_csv(path)
+    try:
+        return pd.read_csv(path, dtype=dtypes, usecols=list(dtypes))
+    except (ValueError, UnicodeDecodeError) as e:
+        print(f"Skipping {path}: {e}")
+        return None
+
+
+def load_all_csv_from_data(pattern="01_extract/data/*.csv", schema=None, manifest_path=None, max_workers=None):
+    files = sorted(glob.glob(pattern))                  # 1. Search CSVs
+    manifest = load_manifest(manifest_path)
+
+    # 2. Cheap checks first: unchanged files and wrong headers
+    to_read = []
+    touched = False
+    for file in files:
+        old_mtime = manifest.get(file, {}).get("mtime")
+        if manifest_path and is_unchanged(file, manifest):
+            touched |= manifest[file]["mtime"] != old_mtime
+            continue
+        if schema:
+            header = read_header(file)
+            if header is None:
+                print(f"Skipping {file}: not a UTF-8 file")
+                continue
+            if not set(schema).issubset(header):
+                print(f"Skipping {file}: header does not match the schema")
+                continue
+        to_read.append(file)
+
+    # Touched files have a new mtime: save it, or their content is hashed
+    # again on every run
+    if touched:
+        save_manifest(manifest, manifest_path)
+
+    if not to_read:
+        print("No new CSV files found.")
+        return None
+
+    # 3. Parse in parallel (fork avoids re-running this script in the workers)
+    if "fork" in multiprocessing.get_all_start_methods():
+        executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("fork"))
     else:
-        print("No CSV files found.")
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    with executor:
+        dataframes = list(executor.map(parse_csv_file, to_read, [schema] * len(to_read)))
+
+    # Files that failed to parse stay out of the manifest, so they are retried
+    parsed = [file for file, df in zip(to_read, dataframes) if df is not None]
+    dataframes = [df for df in dataframes if df is not None]
+    if not dataframes:
         return None
 
+    # 4. Remember what was read
+    if manifest_path:
+        for file in parsed:
+            stat = os.stat(file)
+            manifest[file] = {"mtime": stat.st_mtime, "size": stat.st_size, "sha256": file_hash(file)}
+        save_manifest(manifest, manifest_path)
+
+    # 5. Combine all into a single DataFrame, only once
+    return pd.concat(dataframes, ignore_index=True)
+
 
 # EXERCISE 7 - EXTRACTION FROM AN API
 
@@ -181,6 +407,39 @@ print(df_api_users.head())
 print(df_api_users.shape)
 print(df_api_users.columns)
 
+# Extra (optional):
+# - The API only returns one page. Every response also includes
+#   "total", "skip" and "limit".
+# - Create fetch_all_users(url, page_size, max_workers) that reads the first
+#   page and then requests the remaining pages at the same time, reusing
+#   one requests.Session (with retries) for every call.
+
+def fetch_all_users(url, page_size=30, max_workers=4):
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+    session.mount("https://", HTTPAdapter(pool_maxsize=max_workers, max_retries=retry))
+
+    def get_json(limit, skip):
+        rq = session.get(url, params={"limit": limit, "skip": skip}, timeout=10)
+        rq.raise_for_status()
+        return rq.json()
+
+    with session:
+        first = get_json(page_size, 0)
+        pages = [pd.DataFrame(first["users"])]
+
+        # The server may cap the page size, so step by the limit it returned
+        limit = first.get("limit") or len(first["users"])
+        skips = range(limit, first["total"], limit) if limit > 0 else []
+
+        def get_page(skip):
+            return pd.DataFrame(get_json(limit, skip)["users"])
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pages += list(executor.map(get_page, skips))
+
+    return pd.concat(pages, ignore_index=True)
+
 
 # EXERCISE 8 - SELECT AND RENAME API COLUMNS
 
@@ -267,24 +526,46 @@ combined_data = {
 #       }
 # 2. Call extract() and save the result in a variable.
 # 3. Print the dictionary keys and the shape of each DataFrame.
+#
+# Extra (optional):
+# - Run the four reads at the same time with a ThreadPoolExecutor,
+#   so the local files are parsed while the API request is in flight.
+# - Give every source a timeout (in seconds).
 
-def extract():
-    mcsv = pd.read_csv("01_extract/data/simple_users.csv")
-    mjson = pd.read_json("01_extract/data/simple_users.json")
-    mjsonl = pd.read_json("01_extract/data/api_sample.jsonl", lines=True)
-
-    rq = requests.get("https://dummyjson.com/users?limit=10")
+def extract_api_users(url, timeout=10):
+    rq = requests.get(url, timeout=timeout)
     rqj = rq.json()
+    return pd.DataFrame(rqj["users"])
 
-    mrequest = pd.DataFrame(rqj["users"])
 
-    extracted_data = {
-        "csv": mcsv,
-        "json": mjson,
-        "jsonl": mjsonl,
-        "api_users": mrequest
+def extract(timeout=30):
+    sources = {
+        "csv": (pd.read_csv, "01_extract/data/simple_users.csv", {}),
+        "json": (pd.read_json, "01_extract/data/simple_users.json", {}),
+        "jsonl": (pd.read_json, "01_extract/data/api_sample.jsonl", {"lines": True}),
+        "api_users": (extract_api_users, "https://dummyjson.com/users?limit=10", {"timeout": timeout}),
     }
 
+    executor = ThreadPoolExecutor(max_workers=len(sources))
+    deadline = time.monotonic() + timeout
+
+    try:
+        futures = {
+            key: executor.submit(func, arg, **kwargs)
+            for key, (func, arg, kwargs) in sources.items()
+        }
+
+        # Every source shares one deadline, so the waits do not add up
+        extracted_data = {}
+        for key, future in futures.items():
+            try:
+                extracted_data[key] = future.result(timeout=max(0, deadline - time.monotonic()))
+            except TimeoutError:
+                raise TimeoutError(f"Source '{key}' did not finish in {timeout}s")
+    finally:
+        # Do not wait for a source that already timed out
+        executor.shutdown(wait=False, cancel_futures=True)
+
     return extracted_data
 
 
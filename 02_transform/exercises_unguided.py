@@ -19,6 +19,15 @@
 #
 
 import pandas as pd
+import numpy as np
+import re
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numexpr as ne
+except ImportError:
+    ne = None
 
 
 # EXERCISE 1 - CONVERT UNITS IN heights_weights.csv
@@ -219,9 +228,409 @@ print(df_clean.dtypes)
 
 
 df_final = pd.merge(df_clean, df_hw, on= "name" , how = "inner")
+
+# Extra (optional):
+# - Names are messy string keys: " Ana" and "ana" do not match, and a
+#   repeated name silently multiplies rows.
+# - Create join_on_key(left, right, on, how) that:
+#   * normalizes the key (strip + lowercase) and factorizes both sides
+#     into shared integer codes, so the merge compares integers
+#   * prints the join cardinality (one_to_one, many_to_many...) and the
+#     number of rows before and after, so a blowup is visible
+
+def join_on_key(left, right, on, how="inner"):
+    left_key = left[on].astype("string").str.strip().str.lower()
+    right_key = right[on].astype("string").str.strip().str.lower()
+
+    codes, _ = pd.factorize(pd.concat([left_key, right_key], ignore_index=True))
+    left = left.assign(_key=codes[:len(left)])
+    right = right.drop(columns=on).assign(_key=codes[len(left):])
+
+    # Nulls get code -1 and must not match each other
+    left_many = left.loc[left["_key"] >= 0, "_key"].duplicated().any()
+    right_many = right.loc[right["_key"] >= 0, "_key"].duplicated().any()
+    cardinality = f"{'many' if left_many else 'one'}_to_{'many' if right_many else 'one'}"
+
+    right = right[right["_key"] >= 0]
+    df = left.merge(right, on="_key", how=how).drop(columns="_key")
+    print(f"Join on {on}: {cardinality}, {len(left)} x {len(right)} -> {len(df)} rows")
+    return df
+
+
+df_joined = join_on_key(df_clean, df_hw, on="name")
  
 
 
+#  CLEANING RULES ENGINE (USED BY transform())
+#
+# OBJECTIVE:
+# - Describe the text cleaning once, as data, instead of chaining
+#   .str.strip().str.title()... by hand for every column.
+#
+# HOW IT WORKS:
+# - CLEANING_RULES lists the steps for each column, in order.
+# - compile_rules() turns every list of steps into one function, once.
+# - apply_rules() factorizes each column, cleans only the distinct
+#   values, and maps the result back to the rows in a single pass.
+# - Columns in CATEGORICAL_COLUMNS come back as "category" dtype.
+# - Columns in VALIDATION_PATTERNS get an extra <column>_valid flag.
+#
+
+EMAIL_PATTERN = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+# Keys are already stripped and lowercase
+COUNTRY_ALIASES = {
+    "españa": "spain",
+    "es": "spain",
+    "fr": "france",
+    "uk": "united kingdom",
+    "gb": "united kingdom",
+}
+
+CLEANING_RULES = {
+    "name": ["strip", "title"],
+    "email": ["strip", "lower"],
+    "country": ["strip", "lower", ("map", COUNTRY_ALIASES), "title"],
+}
+
+CATEGORICAL_COLUMNS = ["country"]
+
+VALIDATION_PATTERNS = {
+    "email": EMAIL_PATTERN,
+}
+
+CLEANING_STEPS = {
+    "strip": lambda s: s.str.strip(),
+    "lower": lambda s: s.str.lower(),
+    "upper": lambda s: s.str.upper(),
+    "title": lambda s: s.str.title(),
+    "collapse_spaces": lambda s: s.str.replace(r"\s+", " ", regex=True),
+}
+
+
+def compile_rules(rules):
+    compiled = {}
+
+    for column, steps in rules.items():
+        functions = []
+        for step in steps:
+            if isinstance(step, tuple) and step[0] == "map":
+                mapping = step[1]
+                functions.append(lambda s, mapping=mapping: s.replace(mapping))
+            else:
+                functions.append(CLEANING_STEPS[step])
+
+        def clean(values, functions=functions):
+            for function in functions:
+                values = function(values)
+            return values
+
+        compiled[column] = clean
+
+    return compiled
+
+
+def apply_rules(df, compiled_rules):
+    # Works in place on df (the caller owns it) and also returns it
+    for column, clean in compiled_rules.items():
+        if column not in df.columns:
+            continue
+
+        # 1. Only the distinct values are cleaned (code -1 means null)
+        codes, uniques = pd.factorize(df[column])
+        cleaned = clean(pd.Series(uniques, dtype="string"))
+
+        # 2. Optional format check, also computed on the distinct values
+        if column in VALIDATION_PATTERNS:
+            valid = cleaned.str.fullmatch(VALIDATION_PATTERNS[column]).fillna(False)
+            df[f"{column}_valid"] = np.append(valid.to_numpy(dtype=bool), False)[codes]
+
+        # 3. Map the cleaned values back onto the rows
+        if column in CATEGORICAL_COLUMNS:
+            new_codes, categories = pd.factorize(cleaned)
+            # Extra -1 at the end: null rows (code -1) stay null, even when
+            # every row is null and new_codes is empty
+            row_codes = np.append(new_codes, -1)[codes]
+            df[column] = pd.Categorical.from_codes(row_codes, categories)
+        else:
+            values = np.append(cleaned.to_numpy(dtype=object, na_value=np.nan), np.nan)
+            df[column] = values[codes]
+
+    return df
+
+
+COMPILED_RULES = compile_rules(CLEANING_RULES)
+
+
+#  HEIGHT/WEIGHT KERNEL (USED BY transform())
+#
+# OBJECTIVE:
+# - Exercises 1 and 2 compute height_m, weight_kg and BMI as separate
+#   column operations, and round() each Series: every step allocates a
+#   full-length temporary and reads the data from memory again.
+#
+# HOW IT WORKS:
+# - derive_hw_metrics() walks the rows in blocks of KERNEL_BLOCK_ROWS,
+#   small enough to stay in the CPU cache, and computes every output of a
+#   block (inch -> m, lb -> kg, rounding, BMI) before moving on. Each
+#   input is read from memory once and each output written once.
+# - All operations write into the output arrays (out=...), so there are
+#   no temporaries. The caller can pass its own `out` arrays and reuse
+#   them for every chunk of a feed.
+# - numexpr is used for the arithmetic when it is installed; rounding
+#   stays in NumPy so the results are the same with or without it.
+# - BMI uses the rounded m and kg, like exercise 2, and the default
+#   float64 gives exactly the same values; float32 halves the memory
+#   traffic when that precision is enough.
+#
+
+INCH_TO_M = 0.0254
+LB_TO_KG = 0.453592
+KERNEL_BLOCK_ROWS = 64 * 1024
+HW_METRICS = ["height_m", "weight_kg", "bmi"]
+
+
+def derive_hw_metrics(height_inch, weight_lb, out=None, dtype=np.float64, decimals=2):
+    height = np.asarray(height_inch, dtype=dtype)
+    weight = np.asarray(weight_lb, dtype=dtype)
+    if out is None:
+        out = {name: np.empty(len(height), dtype=dtype) for name in HW_METRICS}
+    height_m, weight_kg, bmi = (out[name] for name in HW_METRICS)
+
+    for start in range(0, len(height), KERNEL_BLOCK_ROWS):
+        block = slice(start, start + KERNEL_BLOCK_ROWS)
+        h, w, m, kg, b = height[block], weight[block], height_m[block], weight_kg[block], bmi[block]
+
+        if ne is not None:
+            ne.evaluate("h * 0.0254", local_dict={"h": h}, out=m, casting="same_kind")
+            ne.evaluate("w * 0.453592", local_dict={"w": w}, out=kg, casting="same_kind")
+        else:
+            np.multiply(h, INCH_TO_M, out=m)
+            np.multiply(w, LB_TO_KG, out=kg)
+        np.round(m, decimals, out=m)
+        np.round(kg, decimals, out=kg)
+
+        if ne is not None:
+            ne.evaluate("kg / (m * m)", local_dict={"kg": kg, "m": m}, out=b, casting="same_kind")
+        else:
+            np.multiply(m, m, out=b)
+            np.divide(kg, b, out=b)
+        np.round(b, decimals, out=b)
+
+    return out
+
+
+#  PARTITIONED EXECUTION (USED BY transform(partitions=N))
+#
+# OBJECTIVE:
+# - Use every core for the row-by-row work (unit conversion, BMI, text
+#   cleaning), which runs on a single core otherwise.
+#
+# HOW IT WORKS:
+# - run_partitioned() splits every DataFrame into row ranges and runs its
+#   step on a process pool.
+# - The workers get the DataFrames through fork (the inputs are not
+#   pickled) and send their part back through the pool. The final project
+#   (enrich_partitioned) returns the parts through shared memory instead.
+# - The parts are concatenated in order and the categorical columns get
+#   the same categories as a serial run, so the result is identical.
+# - Steps that need every row at once (mean, drop_duplicates) must run
+#   after run_partitioned(), not inside it.
+#
+
+_shared_frames = {}
+
+
+def _init_shared_frames(frames):
+    global _shared_frames
+    _shared_frames = frames
+
+
+def _run_partition(name, rows):
+    step, df = _shared_frames[name]
+    return step(df.iloc[rows].reset_index(drop=True))
+
+
+def run_partitioned(steps, partitions):
+    # steps: {name: (function, df)} -> {name: function(df)}
+    if partitions <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        return {name: step(df) for name, (step, df) in steps.items()}
+
+    tasks = []
+    for name, (_, df) in steps.items():
+        bounds = np.linspace(0, len(df), partitions + 1).astype(int)
+        tasks += [(name, slice(start, stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=partitions, mp_context=context,
+                             initializer=_init_shared_frames, initargs=(steps,)) as executor:
+        results = list(executor.map(_run_partition, *zip(*tasks)))
+
+    output = {}
+    for name in steps:
+        parts = [result for (task_name, _), result in zip(tasks, results) if task_name == name]
+        df = pd.concat(parts, ignore_index=True)
+
+        # Every part built its own categories: rebuild them in order of appearance
+        for column in CATEGORICAL_COLUMNS:
+            if column in df.columns:
+                codes, categories = pd.factorize(df[column].astype("string"))
+                df[column] = pd.Categorical.from_codes(codes, categories)
+        output[name] = df
+
+    return output
+
+
+#  STREAMING NULL IMPUTATION (USED BY transform())
+#
+# OBJECTIVE:
+# - Exercise 6 fills age with median() over the whole DataFrame, which
+#   needs every row in memory. A file read in chunks never has them all.
+#
+# HOW IT WORKS:
+# - Pass 1 reads the chunks once and keeps, per group (e.g. country), a
+#   few numbers: count, mean and M2 (exact mean and variance, merged
+#   chunk by chunk with Chan's formula) and a KLL quantile sketch for an
+#   approximate median.
+# - The sketch keeps at most about 3 * SKETCH_K values per group: when a
+#   level is full, its values are sorted and every other one moves up a
+#   level with twice the weight. The median rank error is about 1%.
+# - Pass 2 reads the chunks again and fills the nulls with the value of
+#   the row's group (or the overall value for unknown groups).
+# - Memory depends on the chunk size and the number of groups, not on
+#   the number of rows.
+#
+
+SKETCH_K = 256
+ALL_ROWS = "__all__"
+
+
+def new_sketch():
+    return {"levels": [np.empty(0)], "n": 0}
+
+
+def sketch_capacity(level, height):
+    return max(2, int(SKETCH_K * (2 / 3) ** (height - 1 - level)))
+
+
+def compact_level(levels, level, rng):
+    items = np.sort(levels[level])
+    odd = len(items) % 2
+    promoted = items[:len(items) - odd][rng.integers(2)::2]
+
+    if level + 1 == len(levels):
+        levels.append(np.empty(0))
+    levels[level + 1] = np.concatenate([levels[level + 1], promoted])
+    levels[level] = items[len(items) - odd:]
+
+
+def sketch_update(sketch, values, rng):
+    levels = sketch["levels"]
+    levels[0] = np.concatenate([levels[0], values])
+    sketch["n"] += len(values)
+
+    level = 0
+    while level < len(levels):
+        if len(levels[level]) > sketch_capacity(level, len(levels)):
+            compact_level(levels, level, rng)
+        level += 1
+
+
+def sketch_quantile(sketch, q):
+    levels = sketch["levels"]
+    items = np.concatenate(levels)
+    if not len(items):
+        return np.nan
+    weights = np.concatenate([np.full(len(values), 2.0 ** level) for level, values in enumerate(levels)])
+
+    order = np.argsort(items, kind="stable")
+    cumulative = np.cumsum(weights[order])
+    return items[order][np.searchsorted(cumulative, q * cumulative[-1])]
+
+
+def new_column_stats():
+    return {"count": 0, "mean": 0.0, "m2": 0.0, "sketch": new_sketch()}
+
+
+def update_column_stats(stats, values, rng):
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return
+
+    n_b, mean_b = len(values), values.mean()
+    m2_b = ((values - mean_b) ** 2).sum()
+    n_a, mean_a = stats["count"], stats["mean"]
+
+    if n_a == 0:
+        stats["mean"], stats["m2"] = mean_b, m2_b
+    else:
+        n = n_a + n_b
+        delta = mean_b - mean_a
+        stats["mean"] = mean_a + delta * n_b / n
+        stats["m2"] += m2_b + delta ** 2 * n_a * n_b / n
+    stats["count"] = n_a + n_b
+
+    sketch_update(stats["sketch"], values, rng)
+
+
+def streaming_stats(chunks, column, by=None, seed=0):
+    rng = np.random.default_rng(seed)
+    stats = {ALL_ROWS: new_column_stats()}
+
+    for chunk in chunks:
+        values = pd.to_numeric(chunk[column], errors="coerce").to_numpy(dtype=float)
+        update_column_stats(stats[ALL_ROWS], values, rng)
+
+        if by is not None:
+            for group, rows in chunk.groupby(by, observed=True).indices.items():
+                update_column_stats(stats.setdefault(group, new_column_stats()), values[rows], rng)
+
+    return stats
+
+
+def summarize_stats(stats):
+    return pd.DataFrame({
+        group: {
+            "count": s["count"],
+            "mean": s["mean"] if s["count"] else np.nan,
+            "std": np.sqrt(s["m2"] / (s["count"] - 1)) if s["count"] > 1 else np.nan,
+            "median": sketch_quantile(s["sketch"], 0.5),
+        }
+        for group, s in stats.items()
+    }).T
+
+
+def fill_values(stats, strategy="median"):
+    summary = summarize_stats(stats)
+    return summary[strategy].to_dict()
+
+
+def apply_fills(chunk, column, fills, by=None):
+    values = pd.to_numeric(chunk[column], errors="coerce")
+    if by is not None:
+        group_fills = chunk[by].map({g: v for g, v in fills.items() if g != ALL_ROWS})
+        values = values.fillna(pd.to_numeric(group_fills, errors="coerce"))
+    chunk[column] = values.fillna(fills[ALL_ROWS])
+    return chunk
+
+
+def impute_csv(path, output_path, column="age", by=None, strategy="median", chunksize=100_000, prepare=None):
+    def read_chunks():
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            yield prepare(chunk) if prepare else chunk
+
+    # Pass 1: statistics only
+    stats = streaming_stats(read_chunks(), column, by)
+    fills = fill_values(stats, strategy)
+
+    # Pass 2: fill and write chunk by chunk
+    for i, chunk in enumerate(read_chunks()):
+        apply_fills(chunk, column, fills, by).to_csv(output_path, mode="w" if i == 0 else "a",
+                                                     header=(i == 0), index=False)
+
+    return summarize_stats(stats)
+
+
 #  EXERCISE 10 - CREATE A transform() FUNCTION
 #
 # OBJECTIVE:
@@ -244,21 +653,31 @@ df_final = pd.merge(df_clean, df_hw, on= "name" , how = "inner")
 #     return df_hw_final, df_clean_final
 #
  
-def transform():
-    ddf_h = pd.read_csv("02_transform/data/heights_weights.csv")
-    ddf_h["m"] = round(ddf_h["height_inch"] * 0.0254 , 2)
-    ddf_h["kg"] = round(ddf_h["weight_lb"] * 0.453592 , 2)
-    ddf_h["BMI"] = round(ddf_h["kg"] / (ddf_h["m"] ** 2), 2)
+# Extra (optional):
+# - transform(partitions=N) runs the row-by-row steps on N processes
+#   (see PARTITIONED EXECUTION above).
+
+def convert_units(ddf_h):
+    metrics = derive_hw_metrics(ddf_h["height_inch"].to_numpy(), ddf_h["weight_lb"].to_numpy())
+    ddf_h["m"] = metrics["height_m"]
+    ddf_h["kg"] = metrics["weight_kg"]
+    ddf_h["BMI"] = metrics["bmi"]
+    return ddf_h
+
 
+def clean_dirty(ddf_d):
+    return apply_rules(ddf_d, COMPILED_RULES)
+
+
+def transform(partitions=1):
+    ddf_h = pd.read_csv("02_transform/data/heights_weights.csv")
     ddf_d = pd.read_csv("02_transform/data/dirty_data.csv")
-    ddf_d["name"] = ddf_d["name"].str.strip().str.title()
-    ddf_d["email"] = ddf_d["email"].str.strip().str.lower()
 
-    m_age = ddf_d["age"].mean()
-    ddf_d["age"] = ddf_d["age"].fillna(m_age)
+    results = run_partitioned({"hw": (convert_units, ddf_h), "dirty": (clean_dirty, ddf_d)}, partitions)
+    ddf_h, ddf_d = results["hw"], results["dirty"]
 
-    ddf_d["country"] = ddf_d["country"].str.replace("España", "Spain")
-    ddf_d["country"] = ddf_d["country"].str.strip().str.title()
+    stats = streaming_stats([ddf_d], "age")
+    ddf_d = apply_fills(ddf_d, "age", fill_values(stats, "mean"))
 
     ddf_d.drop_duplicates(inplace=True)
 
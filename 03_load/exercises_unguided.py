@@ -125,8 +125,20 @@ df_small.to_csv("output/data_contacts.csv" , index= False)
 #       output/data_users.xlsx
 # 2. Use a custom sheet name, for example: "Users".
 #
+# NOTE:
+# - save_excel(..., excel_mode="streaming") uses write_excel_streaming()
+#   from exercise 13 instead (constant memory, a new sheet when one is full).
+#
  
-df.to_excel("output/data_users.xlsx", sheet_name="Users", index=False)
+def save_excel(df, path, sheet_name="Sheet1", excel_mode="pandas"):
+    if excel_mode == "streaming":
+        return write_excel_streaming(df, path, sheet_name=sheet_name)
+    if excel_mode != "pandas":
+        raise ValueError(f"Unknown Excel mode: {excel_mode}")
+    df.to_excel(path, sheet_name=sheet_name, index=False)
+    return 1
+
+save_excel(df, "output/data_users.xlsx", sheet_name="Users")
 
 
 # 7 EXERCISE 7 - CREATE A save_all_formats() FUNCTION
@@ -150,11 +162,11 @@ df.to_excel("output/data_users.xlsx", sheet_name="Users", index=False)
 
  
 
-def save_all_formats(df, basename):
+def save_all_formats(df, basename, excel_mode="pandas"):
     os.makedirs("output" , exist_ok= True)
     df.to_csv(f"output/{basename}.csv" , index= False)
     df.to_json(f"output/{basename}.json" , orient = "records" , indent = 2 )
-    df.to_excel(f"output/{basename}.xlsx" ,index = False )
+    save_excel(df, f"output/{basename}.xlsx", excel_mode=excel_mode)
 
 save_all_formats(df, "users_full")
 
@@ -273,3 +285,599 @@ df_clean_final = df.copy()
 final_load_pipeline(df_hw_final, df_clean_final)
 
 
+
+
+
+# 11 EXTRA - COLUMNAR FORMATS (PARQUET / FEATHER)
+#
+# OBJECTIVE:
+# - CSV, JSON and Excel are slow to write and to read back, and they are
+#   large on disk. Parquet and Feather (Arrow IPC) are columnar, compressed
+#   and keep the column types.
+#
+# TASKS:
+# 1. Create a function save_columnar(df, basename, partition_col=None) that:
+#    - converts text columns with few distinct values to "category"
+#      (they are stored as dictionaries)
+#    - saves output/BASENAME.parquet (zstd compression)
+#    - saves output/BASENAME.feather (zstd compression)
+#    - if partition_col is given, saves the Parquet output as a folder
+#      with one sub-folder per value of that column
+# 2. Create a function read_columnar(path, columns=None) that reads back
+#    only the requested columns.
+#
+# NOTE:
+# - Both formats need the pyarrow library.
+#
+
+import shutil
+
+
+def save_columnar(df, basename, partition_col=None):
+    os.makedirs("output", exist_ok=True)
+
+    df = df.copy()
+    for col in df.select_dtypes(include=["object", "string"]).columns:
+        if df[col].nunique() <= len(df) / 2:
+            df[col] = df[col].astype("category")
+
+    parquet_path = f"output/{basename}.parquet"
+    if os.path.isdir(parquet_path):
+        shutil.rmtree(parquet_path)
+    elif os.path.exists(parquet_path):
+        os.remove(parquet_path)
+
+    if partition_col:
+        df.to_parquet(parquet_path, index=False, partition_cols=[partition_col], compression="zstd")
+    else:
+        df.to_parquet(parquet_path, index=False, compression="zstd")
+
+    df.reset_index(drop=True).to_feather(f"output/{basename}.feather", compression="zstd")
+
+
+def read_columnar(path, columns=None):
+    if path.endswith(".feather"):
+        return pd.read_feather(path, columns=columns)
+    return pd.read_parquet(path, columns=columns)
+
+save_columnar(df, "users_full")
+print(read_columnar("output/users_full.parquet", columns=["name", "email"]).head())
+
+
+
+# 12 EXTRA - WRITE ALL FORMATS IN PARALLEL
+#
+# OBJECTIVE:
+# - save_all_formats() writes CSV, then JSON, then Excel. Excel alone is
+#   often slower than the other two together.
+#
+# TASKS:
+# 1. Create a function save_all_formats_parallel(df, basename) that:
+#    - writes the same three files as save_all_formats()
+#    - runs the three writers at the same time in a process pool
+#      (the JSON and Excel encoders are CPU-bound)
+#    - writes each file to a temporary name and renames it at the end,
+#      so a failed write never leaves half a file behind
+#    - returns how many seconds each format took
+#
+# NOTE:
+# - The pool uses "fork", so the workers get df without copying it.
+#   Where fork is not available, threads are used instead.
+#
+
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+# Set before the pool starts: forked workers (and threads) read it from here
+df_to_save = None
+
+
+def write_one_format(fmt, path):
+    df = df_to_save
+    start = time.perf_counter()
+
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.tmp{os.getpid()}{ext}"
+
+    try:
+        if fmt == "csv":
+            df.to_csv(tmp_path, index=False)
+        elif fmt == "json":
+            df.to_json(tmp_path, orient="records", indent=2)
+        elif fmt == "xlsx":
+            df.to_excel(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    finally:
+        # A writer that fails half-way leaves a partial temp file
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return time.perf_counter() - start
+
+
+def save_all_formats_parallel(df, basename):
+    global df_to_save
+    os.makedirs("output", exist_ok=True)
+    df_to_save = df
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        executor = ProcessPoolExecutor(max_workers=3, mp_context=multiprocessing.get_context("fork"))
+    else:
+        executor = ThreadPoolExecutor(max_workers=3)
+
+    with executor:
+        futures = {
+            fmt: executor.submit(write_one_format, fmt, f"output/{basename}.{fmt}")
+            for fmt in ["csv", "json", "xlsx"]
+        }
+        timings = {fmt: future.result() for fmt, future in futures.items()}
+
+    for fmt, seconds in timings.items():
+        print(f"{fmt}: {seconds:.3f}s")
+
+    return timings
+
+save_all_formats_parallel(df, "users_full")
+
+
+
+# 13 EXTRA - FAST EXCEL WRITER
+#
+# OBJECTIVE:
+# - to_excel() builds the whole workbook in memory before writing it, and
+#   it is by far the slowest format. A sheet also holds at most 1,048,576
+#   rows.
+#
+# TASKS:
+# 1. Create a function write_excel_streaming(df, path, sheet_name) that:
+#    - uses openpyxl's write-only mode, which streams the rows to disk
+#      (memory stays the same for 1k or 1M rows)
+#    - converts the rows chunk by chunk (Excel has no NaN and no time zones)
+#    - starts a new sheet (Users, Users_2, ...) when a sheet is full
+#    - returns the number of sheets written
+# 2. Create a function save_excel_datasets(datasets, folder) that writes
+#    several DataFrames ({name: df}) to folder/NAME.xlsx, one worker each.
+# 3. Write exercises 6 and 7 again with excel_mode="streaming".
+#
+# NOTE:
+# - Same as in exercise 12: the workers are forked, so they read the
+#   DataFrames from a global without copying them.
+#
+
+from openpyxl import Workbook
+
+EXCEL_MAX_ROWS = 1_048_576      # per sheet, header included
+EXCEL_CHUNK_ROWS = 10_000
+
+
+def excel_rows(df, chunksize=EXCEL_CHUNK_ROWS):
+    for start in range(0, len(df), chunksize):
+        chunk = df.iloc[start:start + chunksize].copy()
+        for col in chunk.select_dtypes(include=["datetimetz"]).columns:
+            chunk[col] = chunk[col].dt.tz_localize(None)
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        yield from chunk.itertuples(index=False, name=None)
+
+
+def write_excel_streaming(df, path, sheet_name="Sheet1", max_rows=EXCEL_MAX_ROWS):
+    workbook = Workbook(write_only=True)
+    header = [str(col) for col in df.columns]
+    rows_per_sheet = max_rows - 1
+
+    sheets = 0
+    written = rows_per_sheet
+    for row in excel_rows(df):
+        if written == rows_per_sheet:
+            sheets += 1
+            sheet = workbook.create_sheet(sheet_name if sheets == 1 else f"{sheet_name}_{sheets}")
+            sheet.append(header)
+            written = 0
+        sheet.append(row)
+        written += 1
+
+    if sheets == 0:             # empty DataFrame: header only
+        sheets = 1
+        workbook.create_sheet(sheet_name).append(header)
+
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.tmp{os.getpid()}{ext}"
+    workbook.save(tmp_path)
+    os.replace(tmp_path, path)
+    return sheets
+
+
+# Set before the pool starts, like df_to_save
+datasets_to_save = {}
+
+
+def write_excel_dataset(name, path):
+    # Excel sheet names are limited to 31 characters
+    return write_excel_streaming(datasets_to_save[name], path, sheet_name=name[:31])
+
+
+def save_excel_datasets(datasets, folder="output"):
+    global datasets_to_save
+    os.makedirs(folder, exist_ok=True)
+    datasets_to_save = datasets
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        executor = ProcessPoolExecutor(max_workers=len(datasets), mp_context=multiprocessing.get_context("fork"))
+    else:
+        executor = ThreadPoolExecutor(max_workers=len(datasets))
+
+    with executor:
+        futures = {
+            name: executor.submit(write_excel_dataset, name, f"{folder}/{name}.xlsx")
+            for name in datasets
+        }
+        sheets = {name: future.result() for name, future in futures.items()}
+
+    for name, count in sheets.items():
+        print(f"{folder}/{name}.xlsx: {count} sheet(s)")
+
+    return sheets
+
+save_excel_datasets({"heights_weights_final": df_hw_final, "users_clean_final": df_clean_final}, "output_final")
+
+# Exercises 6 and 7 with the streaming writer
+save_excel(df, "output/data_users.xlsx", sheet_name="Users", excel_mode="streaming")
+save_all_formats(df, "users_full", excel_mode="streaming")
+
+
+
+# 14 EXTRA - VERSIONED OUTPUT STORE
+#
+# OBJECTIVE:
+# - save_with_timestamp() writes a full new CSV on every call, even when
+#   the data did not change (see save_20251202_152539.csv and
+#   data_clean_v2.* in output/). Hourly snapshots then grow with the total
+#   data size instead of with the changes.
+#
+# HOW IT WORKS:
+# - The rows are cut into chunks where a row's hash says so (content-
+#   defined boundaries): an inserted or edited row only changes the chunk
+#   around it, the other chunks stay the same.
+# - A chunk is identified by the hash of its row hashes, so known chunks
+#   are never even converted to CSV.
+# - New chunks are stored once, gzip compressed, in output/store/objects.
+# - A version is a list of chunk ids in output/store/BASE_NAME/manifest.json,
+#   together with the column dtypes, so restore_version() gives back the
+#   same types (dates, nullable ints, booleans...) instead of re-guessing.
+#   Category columns also keep their categories (with the categories' own
+#   dtype, so Categorical([1, 2]) does not come back as "1", "2").
+#   Object columns keep the type their values share (ints, floats,
+#   booleans, dates, decimals); object columns of mixed types come back
+#   as strings.
+# - Nulls are written as \N (as in PostgreSQL COPY), so they stay apart
+#   from empty strings.
+#
+# TASKS:
+# 1. save_version(df, base_name) stores a new version, or nothing when the
+#    content is the same as the latest version.
+# 2. list_versions(base_name) shows the stored versions.
+# 3. restore_version(base_name, version=None) rebuilds a version (the
+#    latest by default) as a DataFrame.
+#
+
+import gzip
+import hashlib
+import io
+import json
+import numpy as np
+from decimal import Decimal
+
+STORE_DIR = "output/store"
+CHUNK_AVG_ROWS = 1024               # a row ends a chunk when hash % CHUNK_AVG_ROWS == 0
+CHUNK_MAX_ROWS = 8 * CHUNK_AVG_ROWS
+NULL_MARKER = "\\N"
+
+# Object columns whose values all have one of these types get it back
+OBJECT_PARSERS = {
+    "integer": int,
+    "floating": float,
+    "boolean": {"True": True, "False": False}.__getitem__,
+    "datetime": pd.Timestamp,
+    "date": lambda text: pd.Timestamp(text).date(),
+    "decimal": Decimal,
+}
+
+
+def chunk_bounds(row_hashes):
+    cuts = np.flatnonzero(row_hashes % CHUNK_AVG_ROWS == 0) + 1
+
+    bounds = [0]
+    for cut in list(cuts) + [len(row_hashes)]:
+        while cut - bounds[-1] > CHUNK_MAX_ROWS:
+            bounds.append(bounds[-1] + CHUNK_MAX_ROWS)
+        if cut > bounds[-1]:
+            bounds.append(cut)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def chunk_path(chunk_id, store=STORE_DIR):
+    return os.path.join(store, "objects", chunk_id[:2], f"{chunk_id}.csv.gz")
+
+
+def manifest_path(base_name, store=STORE_DIR):
+    return os.path.join(store, base_name, "manifest.json")
+
+
+def load_versions(base_name, store=STORE_DIR):
+    path = manifest_path(base_name, store)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_versions(versions, base_name, store=STORE_DIR):
+    path = manifest_path(base_name, store)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(versions, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def save_version(df, base_name, store=STORE_DIR):
+    df = df.reset_index(drop=True)
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    bounds = chunk_bounds(row_hashes)
+    chunk_ids = [hashlib.sha256(row_hashes[start:stop].tobytes()).hexdigest() for start, stop in bounds]
+
+    dtypes = [[str(col), *describe_dtype(df[col])] for col in df.columns]
+    schema = json.dumps(dtypes)
+    content_hash = hashlib.sha256((schema + "".join(chunk_ids)).encode("utf-8")).hexdigest()
+
+    versions = load_versions(base_name, store)
+    if versions and versions[-1]["content_hash"] == content_hash:
+        print(f"{base_name}: unchanged, still version {versions[-1]['version']}")
+        return versions[-1]["version"]
+
+    # Only chunks that no earlier version stored are converted and written
+    new_chunks = 0
+    for (start, stop), chunk_id in zip(bounds, chunk_ids):
+        path = chunk_path(chunk_id, store)
+        if os.path.exists(path):
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with gzip.open(tmp_path, "wb") as f:
+            f.write(df.iloc[start:stop].to_csv(index=False, header=False, na_rep=NULL_MARKER).encode("utf-8"))
+        os.replace(tmp_path, path)
+        new_chunks += 1
+
+    version = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{content_hash[:8]}"
+    versions.append({
+        "version": version,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "content_hash": content_hash,
+        "columns": [str(col) for col in df.columns],
+        "dtypes": dtypes,
+        "rows": len(df),
+        "chunks": chunk_ids,
+        "new_chunks": new_chunks,
+    })
+    save_versions(versions, base_name, store)
+
+    print(f"{base_name}: saved version {version} ({new_chunks} of {len(chunk_ids)} chunks new)")
+    return version
+
+
+def list_versions(base_name, store=STORE_DIR):
+    versions = load_versions(base_name, store)
+    return pd.DataFrame(
+        [{key: v[key] for key in ["version", "created", "rows", "new_chunks"]} for v in versions],
+        columns=["version", "created", "rows", "new_chunks"],
+    )
+
+
+def restore_version(base_name, version=None, store=STORE_DIR):
+    versions = load_versions(base_name, store)
+    matches = [v for v in versions if version is None or v["version"] == version]
+    if not matches:
+        raise ValueError(f"No version {version!r} of {base_name}")
+    entry = matches[-1]
+
+    buffer = io.BytesIO()
+    buffer.write(pd.DataFrame(columns=entry["columns"]).to_csv(index=False).encode("utf-8"))
+    for chunk_id in entry["chunks"]:
+        with gzip.open(chunk_path(chunk_id, store), "rb") as f:
+            buffer.write(f.read())
+    buffer.seek(0)
+
+    # Read as text, then give every column its saved dtype back
+    df = pd.read_csv(buffer, dtype=str, keep_default_na=False, na_values=[NULL_MARKER])
+    for col, dtype, *details in entry["dtypes"]:
+        df[col] = restore_dtype(df[col], dtype, details[0] if details else None)
+    return df
+
+
+def describe_dtype(values):
+    # What restore_dtype() needs besides the dtype name
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories
+        return [str(values.dtype), {
+            "categories": [str(value) for value in categories],
+            "categories_dtype": str(categories.dtype),
+            "ordered": bool(values.cat.ordered),
+        }]
+    if values.dtype == object:
+        return [str(values.dtype), {"values": pd.api.types.infer_dtype(values, skipna=True)}]
+    return [str(values.dtype)]
+
+
+def restore_dtype(values, dtype, details=None):
+    details = details or {}
+    if dtype == "category" and "categories" in details:
+        categories = restore_dtype(pd.Series(details["categories"], dtype=object), details["categories_dtype"])
+        # Nulls rule out astype() for int and bool categories
+        if pd.api.types.is_bool_dtype(categories):
+            values = values.map({"True": True, "False": False})
+        elif pd.api.types.is_numeric_dtype(categories):
+            values = pd.to_numeric(values)
+        else:
+            values = restore_dtype(values, details["categories_dtype"])
+        return pd.Series(pd.Categorical(values, categories=categories, ordered=details["ordered"]),
+                         index=values.index)
+    if dtype == "object" and details.get("values") in OBJECT_PARSERS:
+        # Object columns hold Python objects anyway, so this loop costs no
+        # more than the column itself; nulls come back as None
+        parse = OBJECT_PARSERS[details["values"]]
+        return pd.Series([None if pd.isna(text) else parse(text) for text in values],
+                         index=values.index, dtype=object)
+    if dtype.startswith("datetime64"):
+        # Time zone aware columns are written with their UTC offset
+        return pd.to_datetime(values, format="ISO8601", utc="," in dtype).astype(dtype)
+    if dtype.startswith("timedelta64"):
+        return pd.to_timedelta(values).astype(dtype)
+    if dtype in ("bool", "boolean"):
+        return values.map({"True": True, "False": False}).astype(dtype)
+    return values.astype(dtype)
+
+save_version(df, "users_version")
+save_version(df, "users_version")          # same content: nothing is written
+print(list_versions("users_version"))
+
+
+
+# 15 EXTRA - CONCURRENT-SAFE save_if_not_exists()
+#
+# OBJECTIVE:
+# - save_if_not_exists() checks os.path.exists() and then writes. Two
+#   workers can both see "no file" and both write: one overwrites the
+#   other, or a reader sees half a file.
+#
+# HOW IT WORKS:
+# - A worker reserves a path by creating PATH.lock with O_CREAT | O_EXCL:
+#   the operating system lets only one process create it.
+# - The data is written to a temporary file in the same folder, then
+#   published with os.link(), which fails if PATH already exists (so
+#   nothing is ever overwritten, even by a writer that does not lock).
+# - A lock older than LOCK_STALE_SECONDS belongs to a crashed worker and
+#   can be taken over. The stale lock is renamed to a unique name first:
+#   of several workers that find it, only one rename succeeds, so only
+#   that worker tries O_EXCL again (removing it instead could delete the
+#   fresh lock another worker had just created).
+# - save_many_if_not_exist() reserves all its paths in one pass, then
+#   writes the reserved ones on a thread pool.
+#
+
+import tempfile
+import uuid
+
+LOCK_STALE_SECONDS = 600
+
+
+def lock_is_stale(lock_path):
+    return time.time() - os.path.getmtime(lock_path) >= LOCK_STALE_SECONDS
+
+
+def take_over_stale_lock(lock_path):
+    stale_path = f"{lock_path}.{uuid.uuid4().hex}.stale"
+    try:
+        os.rename(lock_path, stale_path)
+    except FileNotFoundError:
+        return False                            # another worker got there first
+
+    # Between the age check and the rename, another worker may have taken
+    # the lock over: give its fresh lock back (os.link never replaces)
+    if not lock_is_stale(stale_path):
+        try:
+            os.link(stale_path, lock_path)
+        except FileExistsError:
+            pass
+        os.remove(stale_path)
+        return False
+
+    os.remove(stale_path)
+    return True
+
+
+def reserve_path(path):
+    lock_path = f"{path}.lock"
+    for _ in range(2):
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if not lock_is_stale(lock_path):
+                    return False
+            except FileNotFoundError:
+                continue                        # released meanwhile: try once more
+            if not take_over_stale_lock(lock_path):
+                return False
+            continue                            # stale lock taken over: try once more
+
+        with os.fdopen(fd, "w") as f:
+            f.write(f"{os.getpid()} {time.time()}\n")
+
+        # Reserved, but another worker may have finished before we started
+        if os.path.exists(path):
+            release_path(path)
+            return False
+        return True
+
+    return False
+
+
+def release_path(path):
+    try:
+        os.remove(f"{path}.lock")
+    except FileNotFoundError:
+        pass
+
+
+def reserve_paths(paths):
+    return [path for path in paths if reserve_path(path)]
+
+
+def write_reserved(df, path):
+    folder = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            df.to_csv(f, index=False)
+        try:
+            os.link(tmp_path, path)            # atomic, and never replaces an existing file
+        except FileExistsError:
+            return False
+        except OSError:
+            if os.path.exists(path):           # file system without hard links
+                return False
+            os.replace(tmp_path, path)
+        return True
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        release_path(path)
+
+
+def save_if_not_exists_atomic(df, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if reserve_path(path) and write_reserved(df, path):
+        print(f"File saved successfully: {path}")
+        return True
+    print(f"The file already exists (or is being written): {path}. It has not been overwritten.")
+    return False
+
+
+def save_many_if_not_exist(items, max_workers=8):
+    # items: {path: df} -> {path: True if this call wrote it}
+    for path in items:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    reserved = reserve_paths(list(items))
+    saved = dict.fromkeys(items, False)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {path: executor.submit(write_reserved, items[path], path) for path in reserved}
+        for path, future in futures.items():
+            saved[path] = future.result()
+
+    print(f"Saved {sum(saved.values())} of {len(items)} files")
+    return saved
+
+save_if_not_exists_atomic(df, "output/users_safe_atomic.csv")
+save_if_not_exists_atomic(df, "output/users_safe_atomic.csv")
@@ -0,0 +1,302 @@
+
+# BENCHMARK.PY — PERFORMANCE CHECKS FOR THE FINAL PIPELINE
+#
+# Description:
+# The datasets in data/ have about ten rows, which is far too small to
+# notice a slow change. This script generates dirty user data at any scale
+# and times every stage of final_project.py on it.
+#
+# It includes:
+#   - A synthetic data generator that mimics dirty_data.csv
+#     (extra spaces, mixed case, country aliases, duplicates, nulls,
+#     broken emails)
+#   - Timing and peak memory of extract, transform and load
+#   - A stored baseline: a stage that gets slower or bigger than the
+#     baseline (plus a tolerance) makes the script exit with an error
+#
+# Supported scale:
+#   The generator streams any number of rows to disk, but the stages it
+#   times are the eager ones, which hold the whole dataset in memory.
+#   Plan for roughly 2 KB of RAM per row (about 2 GB at 1e6 rows, 20 GB
+#   at 1e7); 1e8 rows does not fit on ordinary machines.
+#
+# Usage (from the repository root):
+#   python 04_etl_projects/benchmark.py --rows 100000
+#   python 04_etl_projects/benchmark.py --rows 100000 --save-baseline
+
+
+# 0. IMPORTS AND CONFIGURATION
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import final_project as fp
+
+BASELINE_PATH = os.path.join("04_etl_projects", "benchmark_baseline.json")
+
+# A stage fails if it is this much slower (or bigger) than the baseline
+TOLERANCE = 0.25
+
+FIRST_NAMES = ["Ana", "Carlos", "Lucía", "Pedro", "María", "David", "Elena", "John", "Sara", "Miguel"]
+LAST_NAMES = ["García", "López", "Martínez", "Sánchez", "Gómez", "Ruiz", "Torres", "Smith", "Brown", "Fernández"]
+COUNTRY_VARIANTS = ["Spain", "spain", "España", "SPAIN ", " España", "FR", "France",
+                    "Portugal", "United Kingdom", "Germany"]
+PLAN_TYPES = ["free", "premium", "business"]
+
+# Share of rows affected by each kind of dirt (similar to dirty_data.csv)
+DIRT_RATES = {
+    "whitespace": 0.3,
+    "case": 0.3,
+    "null_age": 0.1,
+    "null_email": 0.02,
+    "bad_email": 0.05,
+    "duplicate": 0.15,
+}
+
+
+# 1. SYNTHETIC DATA GENERATOR
+#
+# - generate_users(n, rng) returns n dirty rows with the columns of
+#   final_users.csv; part of them repeat an earlier user
+# - generate_extras(user_ids, rng) returns the matching extra attributes
+#   (the final_users_extra.json columns)
+# - write_dataset() writes both in chunks (the extras as one JSON array,
+#   appended chunk by chunk), so generating never holds more than a chunk
+#
+
+def add_dirt(values, rng, rate, dirt):
+    mask = rng.random(len(values)) < rate
+    values = values.copy()
+    values[mask] = dirt(values[mask])
+    return values
+
+
+def generate_users(n, rng, start_id=1):
+    user_id = np.arange(start_id, start_id + n)
+
+    # Duplicates point back to an earlier user of the same chunk
+    is_duplicate = rng.random(n) < DIRT_RATES["duplicate"]
+    is_duplicate[0] = False
+    source_row = np.where(is_duplicate, (rng.random(n) * np.arange(n)).astype(np.int64), np.arange(n))
+
+    first = np.array(FIRST_NAMES, dtype=object)[rng.integers(0, len(FIRST_NAMES), n)][source_row]
+    last = np.array(LAST_NAMES, dtype=object)[rng.integers(0, len(LAST_NAMES), n)][source_row]
+    email = (pd.Series(first).str.lower() + "." + pd.Series(last).str.lower() + "."
+             + pd.Series(user_id[source_row]).astype(str) + "@example.com").to_numpy(dtype=object)
+
+    email = add_dirt(email, rng, DIRT_RATES["bad_email"], lambda v: pd.Series(v).str.replace("@", "@@").to_numpy())
+    email = add_dirt(email, rng, DIRT_RATES["case"], lambda v: pd.Series(v).str.upper().to_numpy())
+    email = add_dirt(email, rng, DIRT_RATES["whitespace"], lambda v: " " + v + " ")
+    email = add_dirt(email, rng, DIRT_RATES["null_email"], lambda v: np.full(len(v), None))
+
+    first = add_dirt(first, rng, DIRT_RATES["case"], lambda v: pd.Series(v).str.upper().to_numpy())
+    first = add_dirt(first, rng, DIRT_RATES["whitespace"], lambda v: "  " + v + " ")
+
+    age = rng.integers(16, 80, n).astype(object)
+    age = add_dirt(age, rng, DIRT_RATES["whitespace"], lambda v: np.array([f" {a} " for a in v], dtype=object))
+    age = add_dirt(age, rng, DIRT_RATES["null_age"], lambda v: np.full(len(v), None))
+
+    country = np.array(COUNTRY_VARIANTS, dtype=object)[rng.integers(0, len(COUNTRY_VARIANTS), n)]
+
+    days = rng.integers(0, 5 * 365, n)
+    signup_date = (pd.Timestamp("2020-01-01") + pd.to_timedelta(days, unit="D")).strftime("%Y-%m-%d")
+
+    return pd.DataFrame({
+        "user_id": user_id,
+        "first_name": first,
+        "last_name": last,
+        "email": email,
+        "age": age,
+        "country": country,
+        "signup_date": signup_date,
+        "is_active": rng.random(n) < 0.8,
+    })
+
+
+def generate_extras(user_ids, rng):
+    n = len(user_ids)
+    seconds = rng.integers(0, 365 * 24 * 3600, n)
+    last_login = pd.Timestamp("2024-01-01", tz="UTC") + pd.to_timedelta(seconds, unit="s")
+
+    return pd.DataFrame({
+        "user_id": user_ids,
+        "city": rng.choice(["Madrid", "Barcelona", "Paris", "Lisbon", "London", "Berlin"], n),
+        "timezone": rng.choice(["Europe/Madrid", "Europe/Paris", "Europe/London"], n),
+        "plan_type": rng.choice(PLAN_TYPES, n),
+        "last_login": last_login.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "churn_risk_score": rng.random(n).round(2),
+    })
+
+
+def write_dataset(rows, workdir, seed=42, chunksize=1_000_000):
+    rng = np.random.default_rng(seed)
+    csv_path = os.path.join(workdir, "users.csv")
+    json_path = os.path.join(workdir, "users_extra.json")
+
+    with open(json_path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for start in range(0, rows, chunksize):
+            n = min(chunksize, rows - start)
+            df = generate_users(n, rng, start_id=start + 1)
+            df.to_csv(csv_path, mode="a" if start else "w", header=(start == 0), index=False)
+
+            # Each chunk's records without their own brackets
+            records = generate_extras(df["user_id"].to_numpy(), rng).to_json(orient="records")[1:-1]
+            f.write(("," if start else "") + records)
+        f.write("]")
+
+    return csv_path, json_path
+
+
+# 2. STAGE RUNNER
+#
+# - measure(func) runs a stage once under tracemalloc for peak memory and
+#   once untraced for time (tracing slows Python code down, so the two are
+#   kept apart); the traced result is dropped before the timed run, so
+#   only one copy of the output is alive at a time
+#
+
+def measure(func, rows, memory=True):
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        func()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+
+    return result, {
+        "seconds": round(seconds, 4),
+        "rows_per_s": round(rows / seconds, 1) if seconds else None,
+        "peak_mb": round(peak_mb, 2) if peak_mb is not None else None,
+    }
+
+
+def run_benchmark(rows, workdir, memory=True, seed=42):
+    # Keep every pipeline output inside the work folder
+    fp.OUTPUT_DIR = os.path.join(workdir, "output")
+    fp.DEDUP_INDEX_PATH = os.path.join(fp.OUTPUT_DIR, "dedup_index.sqlite")
+    fp.DEDUP_REPORT_PATH = os.path.join(fp.OUTPUT_DIR, "dedup_report.csv")
+    fp.LOG_FILE = os.path.join(workdir, "etl_log.txt")
+    fp.METRICS_PATH = os.path.join(workdir, "etl_metrics.jsonl")
+
+    csv_path, json_path = write_dataset(rows, workdir, seed)
+    results = {}
+
+    # Extract
+    df_csv, results["extract_csv"] = measure(lambda: fp.extract_csv(csv_path), rows, memory)
+    df_json, results["extract_json"] = measure(lambda: fp.extract_json(json_path), rows, memory)
+
+    # Transform: each step alone, then the whole sequence
+    data_sources = {"csv": fp.normalize_columns(df_csv), "json": fp.normalize_columns(df_json)}
+    list_of_dfs = fp.standardize_structures(data_sources)
+    df_combined, results["dedup"] = measure(lambda: fp.combine_sources(list_of_dfs), rows, memory)
+    _, results["enrich"] = measure(lambda: fp.enrich(df_combined), len(df_combined), memory)
+    df_final, results["transform_all"] = measure(
+        lambda: fp.transform_all({"csv": df_csv, "json": df_json}), rows, memory
+    )
+
+    # Load
+    _, results["load_all"] = measure(lambda: fp.load_all(df_final, excel=False), len(df_final), memory)
+
+    fp.flush_metrics()
+    fp.stop_log_writer()
+    return results
+
+
+# 3. BASELINE
+#
+# - Baselines are stored per number of rows in BASELINE_PATH
+# - compare_with_baseline() returns one message per regression
+#
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(baseline, path=BASELINE_PATH):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2)
+
+
+def compare_with_baseline(results, baseline, tolerance=TOLERANCE):
+    regressions = []
+
+    for stage, current in results.items():
+        expected = baseline.get(stage)
+        if not expected:
+            continue
+
+        if current["rows_per_s"] and expected.get("rows_per_s"):
+            if current["rows_per_s"] < expected["rows_per_s"] * (1 - tolerance):
+                regressions.append(
+                    f"{stage}: {current['rows_per_s']:.0f} rows/s, baseline {expected['rows_per_s']:.0f} rows/s"
+                )
+
+        if current["peak_mb"] and expected.get("peak_mb"):
+            if current["peak_mb"] > expected["peak_mb"] * (1 + tolerance):
+                regressions.append(
+                    f"{stage}: {current['peak_mb']:.1f} MB peak, baseline {expected['peak_mb']:.1f} MB"
+                )
+
+    return regressions
+
+
+# 4. main()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the final ETL pipeline on synthetic data.")
+    parser.add_argument("--rows", type=int, default=100_000, help="rows to generate (see 'Supported scale' for memory)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="etl_benchmark_")
+    try:
+        results = run_benchmark(args.rows, workdir, memory=not args.no_memory, seed=args.seed)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"Rows: {args.rows}")
+    for stage, result in results.items():
+        print(f"  {stage:<15} {result['seconds']:>9.3f}s  {result['rows_per_s'] or 0:>12.0f} rows/s  "
+              f"{result['peak_mb'] if result['peak_mb'] is not None else '-':>9} MB")
+
+    baseline = load_baseline()
+    key = str(args.rows)
+
+    if args.save_baseline:
+        baseline[key] = results
+        save_baseline(baseline)
+        print(f"Baseline saved to {BASELINE_PATH}")
+        return
+
+    regressions = compare_with_baseline(results, baseline.get(key, {}), args.tolerance)
+    if regressions:
+        print("\nPERFORMANCE REGRESSION")
+        for message in regressions:
+            print("  -", message)
+        sys.exit(1)
+
+    print("\nNo regressions against the baseline." if key in baseline else "\nNo baseline for this size yet.")
+
+
+if __name__ == "__main__":
+    main()
@@ -34,7 +34,252 @@
 #
 # 7. (Optional): Define global logging variables
 #
-# YOUR CODE HERE
+
+import pandas as pd
+import numpy as np
+import requests
+import json
+import os
+import re
+import sys
+import time
+import hashlib
+import operator
+import queue
+import atexit
+import shutil
+import multiprocessing
+import sqlite3
+import threading
+import cProfile
+import tracemalloc
+import importlib.util
+from datetime import datetime
+from multiprocessing import shared_memory, resource_tracker
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from functools import partial, wraps
+from urllib.parse import parse_qsl
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+DATA_DIR = os.path.join("04_etl_projects", "data")
+OUTPUT_DIR = os.path.join("04_etl_projects", "output_final")
+
+CSV_PATH = os.path.join(DATA_DIR, "final_users.csv")
+JSON_PATH = os.path.join(DATA_DIR, "final_users_extra.json")
+API_URL = "https://dummyjson.com/users?limit=20"
+
+# API pagination: page size comes from ?limit= in the URL (or API_PAGE_SIZE)
+API_PAGE_SIZE = 20
+API_MAX_WORKERS = 4
+API_RETRIES = 3
+API_BACKOFF = 0.5
+
+# On-disk cache for API responses
+#   ETL_CACHE_MODE=default  -> serve fresh entries, revalidate stale ones
+#   ETL_CACHE_MODE=offline  -> cache only, never touch the network
+#   ETL_CACHE_MODE=off      -> always download
+CACHE_DIR = os.path.join("04_etl_projects", ".http_cache")
+CACHE_MODE = os.environ.get("ETL_CACHE_MODE", "default")
+CACHE_TTL = int(os.environ.get("ETL_CACHE_TTL", 3600))
+CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+LOG_FILE = "etl_log.txt"
+# log() hands lines to a background writer: it writes every LOG_FLUSH_RECORDS
+# lines or LOG_FLUSH_SECONDS, and rotates the file at LOG_MAX_BYTES
+LOG_FLUSH_RECORDS = 1000
+LOG_FLUSH_SECONDS = 1.0
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 3
+
+# Stage metrics (one JSON object per line) and optional profiling
+METRICS_PATH = "etl_metrics.jsonl"
+PROFILE = os.environ.get("ETL_PROFILE", "0") == "1"
+PROFILE_PATH = "etl_profile.prof"
+
+# Excel output: "pandas" (to_excel, builds the workbook in memory) or
+# "streaming" (openpyxl write-only, constant memory, one sheet every
+# EXCEL_MAX_ROWS rows)
+EXCEL_MODE = os.environ.get("ETL_EXCEL_MODE", "pandas")
+EXCEL_MAX_ROWS = 1_048_576      # per sheet, header included
+EXCEL_CHUNK_ROWS = 10_000
+
+# Columnar outputs (need pyarrow)
+PARQUET_COMPRESSION = "zstd"
+HIVE_DEFAULT_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+FEATHER_COMPRESSION = "zstd"
+# String columns with fewer distinct values than this ratio are dictionary-encoded
+DICTIONARY_MAX_RATIO = 0.5
+
+# Output formats whose encoders are CPU-bound Python code: written in processes
+PROCESS_FORMATS = {"json", "xlsx"}
+
+CSV_REQUIRED_COLUMNS = ["user_id", "first_name", "last_name", "email"]
+JSON_REQUIRED_COLUMNS = ["user_id"]
+API_REQUIRED_COLUMNS = ["id", "firstName", "lastName", "email"]
+
+# Schema registry: declared dtypes for every file source, so the readers
+# do not have to guess ("datetime" columns are parsed as dates). Columns
+# that arrive dirty are read as text and cast after stripping, with
+# unparseable values turned into nulls instead of failing the read:
+#   "numeric" -> the smallest integer type that fits (float if needed)
+#   "flag"    -> boolean from true/false, yes/no, 1/0
+SCHEMAS = {
+    "users": {
+        "user_id": "Int64",
+        "first_name": "string",
+        "last_name": "string",
+        "email": "string",
+        "age": "numeric",
+        "country": "category",
+        "signup_date": "datetime",
+        "is_active": "flag",
+    },
+    "users_extra": {
+        "user_id": "Int64",
+        "city": "category",
+        "timezone": "category",
+        "plan_type": "category",
+        "last_login": "datetime",
+        "churn_risk_score": "float64",
+    },
+}
+
+FLAG_VALUES = {"true": True, "false": False, "yes": True, "no": False, "1": True, "0": False}
+TEXT_CAST_TYPES = {"numeric", "flag"}
+
+# The pyarrow CSV parser is multi-threaded; fall back to the C parser without it
+CSV_ENGINE = "pyarrow" if importlib.util.find_spec("pyarrow") else "c"
+
+# Rows per chunk when the pipeline runs in streaming mode
+CHUNK_SIZE = 100_000
+
+CSV_COLUMNS = ["user_id", "first_name", "last_name", "email", "age", "country", "signup_date", "is_active"]
+EXTRA_COLUMNS = ["user_id", "city", "timezone", "plan_type", "last_login", "churn_risk_score"]
+# Column order of the final dataset
+FINAL_COLUMNS = CSV_COLUMNS + EXTRA_COLUMNS[1:] + ["source", "full_name", "is_adult"]
+# Dtypes of the final dataset, whatever rows a run happens to contain; a
+# previous output read back from CSV is cast to them too (incremental runs)
+FINAL_DTYPES = {
+    "user_id": "Int64",
+    "first_name": "string",
+    "last_name": "string",
+    "email": "string",
+    "age": "Int64",
+    "country": "string",
+    "signup_date": "datetime64[us]",
+    "is_active": "boolean",
+    "city": "category",
+    "timezone": "category",
+    "plan_type": "category",
+    "last_login": "datetime64[us, UTC]",
+    "churn_risk_score": "float64",
+    "source": "str",
+    "full_name": "string",
+    "is_adult": "boolean",
+}
+
+API_COLUMN_MAP = {
+    "id": "user_id",
+    "firstname": "first_name",
+    "lastname": "last_name",
+    "email": "email",
+    "age": "age",
+    "address.country": "country",
+}
+
+COUNTRY_ALIASES = {
+    "españa": "Spain",
+    "fr": "France",
+    "uk": "United Kingdom",
+}
+
+# Incremental runs: one high-watermark column per source
+STATE_PATH = os.path.join("04_etl_projects", "etl_state.json")
+WATERMARK_COLUMNS = {
+    "csv": "signup_date",
+    "json": "last_login",
+}
+
+# Row-level validation after the transform
+#   ETL_VALIDATION_MODE=sample -> check a random sample and log the invalid rates
+#   ETL_VALIDATION_MODE=full   -> check every row, move invalid rows to QUARANTINE_PATH
+#   ETL_VALIDATION_MODE=off    -> no row-level checks
+VALIDATION_MODE = os.environ.get("ETL_VALIDATION_MODE", "sample")
+VALIDATION_SAMPLE_SIZE = 10_000
+# In sample mode, raise ValueError when a rule fails on more than this share of rows
+VALIDATION_MAX_INVALID_RATE = None
+# None -> OUTPUT_DIR/quarantine.csv, resolved when used (OUTPUT_DIR can change)
+QUARANTINE_PATH = None
+
+# Checks that failed before validation ran (e.g. a cast that turned
+# "abc" into a null age), ";"-separated; dropped once the rows are validated
+INVALID_COLUMN = "_invalid"
+
+EMAIL_PATTERN = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+VALIDATION_RULES = {
+    "email": {"not_null": True, "pattern": EMAIL_PATTERN},
+    "age": {"numeric": True, "min": 0, "max": 120},
+    "churn_risk_score": {"numeric": True, "min": 0, "max": 1},
+}
+
+# Deduplication: when the same email comes from several sources, the
+# source listed first wins
+SURVIVORSHIP = ["csv", "json", "api"]
+DEDUP_KEYS = ["email", "user_id"]
+DEDUP_INDEX_PATH = os.path.join(OUTPUT_DIR, "dedup_index.sqlite")
+DEDUP_REPORT_PATH = os.path.join(OUTPUT_DIR, "dedup_report.csv")
+
+# Partitioned enrich(): worker processes (1 = serial) and how the rows are
+# split ("rows" = contiguous ranges, "user_id" = hash of user_id)
+TRANSFORM_PARTITIONS = int(os.environ.get("ETL_TRANSFORM_PARTITIONS", 1))
+TRANSFORM_PARTITION_BY = "rows"
+
+# Checkpoints: every stage output of an eager run is pickled to CHECKPOINT_DIR,
+# keyed by a hash of its inputs and config, so a rerun skips unchanged stages
+CHECKPOINTS = os.environ.get("ETL_CHECKPOINTS", "1") == "1"
+CHECKPOINT_DIR = os.path.join("04_etl_projects", ".checkpoints")
+# The API has no file to fingerprint: its checkpoint is reused for this many seconds
+CHECKPOINT_API_MAX_AGE = int(os.environ.get("ETL_CHECKPOINT_API_MAX_AGE", 3600))
+# Config that changes the result of transform_all()
+TRANSFORM_CONFIG = [
+    "CSV_COLUMNS", "EXTRA_COLUMNS", "FINAL_COLUMNS", "API_COLUMN_MAP", "COUNTRY_ALIASES",
+    "SURVIVORSHIP", "VALIDATION_MODE", "VALIDATION_RULES", "VALIDATION_SAMPLE_SIZE",
+    "VALIDATION_MAX_INVALID_RATE",
+]
+
+# Join engine: a right side of at most BROADCAST_MAX_ROWS unique keys is
+# broadcast as a lookup table; inputs larger than JOIN_MEMORY_BUDGET bytes are
+# split into JOIN_PARTITIONS partitions on disk and joined one by one
+BROADCAST_MAX_ROWS = 1_000_000
+JOIN_MEMORY_BUDGET = 512 * 1024 * 1024
+JOIN_PARTITIONS = 16
+# None -> OUTPUT_DIR/join_spill, resolved when used (OUTPUT_DIR can change)
+JOIN_SPILL_DIR = None
+
+# Lazy pipeline (main(lazy=True)): output columns (None = FINAL_COLUMNS) and
+# row filters in the Parquet syntax, e.g. [("is_active", "==", True), ("age", ">=", 18)]
+OUTPUT_COLUMNS = None
+OUTPUT_FILTERS = []
+# enrich() does not rewrite these columns, so filters on them can run before the join
+PUSHDOWN_COLUMNS = {"user_id", "age", "is_active", "signup_date", "source"}
+DERIVED_COLUMNS = {
+    "full_name": ["first_name", "last_name"],
+    "is_adult": ["age"],
+}
+
+# Seconds each source may take inside extract_all() before it is abandoned
+SOURCE_TIMEOUTS = {
+    "csv": 60,
+    "json": 60,
+    "api": 30,
+}
 
 
 # 1. LOGGING (OPTIONAL)
@@ -48,7 +293,217 @@
 #       - Create file etl_log.txt if it does not exist
 #       - Write a line: TIMESTAMP, MESSAGE
 #
-# YOUR CODE HERE
+# Asynchronous writer:
+#   - log() only formats the line and puts it on a queue.SimpleQueue
+#     (no Python-level lock, put() never blocks), so logging per batch or
+#     per row stays off the hot path
+#   - A background thread writes the lines in batches: as soon as
+#     LOG_FLUSH_RECORDS lines are waiting, or every LOG_FLUSH_SECONDS
+#   - Before a write would push the file over LOG_MAX_BYTES, it is rotated
+#     to etl_log.txt.1 ... etl_log.txt.LOG_BACKUPS
+#   - stop_log_writer() (end of main(), and at exit) drains the queue, so
+#     no line is lost; the next log() starts a new writer
+#
+
+_log_queue = queue.SimpleQueue()
+_log_thread = None
+_log_thread_lock = threading.Lock()
+_LOG_STOP = object()
+
+
+def log(message):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    _log_queue.put(f"{timestamp},{message}\n")
+    if _log_thread is None or not _log_thread.is_alive():
+        start_log_writer()
+
+
+def start_log_writer():
+    global _log_thread
+    with _log_thread_lock:
+        if _log_thread is None or not _log_thread.is_alive():
+            _log_thread = threading.Thread(target=_log_writer, name="etl-log-writer", daemon=True)
+            _log_thread.start()
+
+
+def stop_log_writer():
+    global _log_thread
+    with _log_thread_lock:
+        if _log_thread is not None and _log_thread.is_alive():
+            _log_queue.put(_LOG_STOP)
+            _log_thread.join()
+        _log_thread = None
+
+
+def rotate_log(incoming_bytes):
+    if not os.path.exists(LOG_FILE) or os.path.getsize(LOG_FILE) + incoming_bytes <= LOG_MAX_BYTES:
+        return
+
+    for i in range(LOG_BACKUPS - 1, 0, -1):
+        if os.path.exists(f"{LOG_FILE}.{i}"):
+            os.replace(f"{LOG_FILE}.{i}", f"{LOG_FILE}.{i + 1}")
+    if LOG_BACKUPS > 0:
+        os.replace(LOG_FILE, f"{LOG_FILE}.1")
+    else:
+        os.remove(LOG_FILE)
+
+
+def write_log_batch(lines):
+    if not lines:
+        return
+    data = "".join(lines)
+    try:
+        rotate_log(len(data.encode("utf-8")))
+        with open(LOG_FILE, "a", encoding="utf-8") as f:
+            f.write(data)
+    except OSError as e:
+        # The writer thread must survive a bad path or a full disk
+        print(f"Could not write {len(lines)} log lines to {LOG_FILE}: {e}", file=sys.stderr)
+
+
+def _log_writer():
+    batch = []
+    deadline = time.monotonic() + LOG_FLUSH_SECONDS
+
+    while True:
+        try:
+            line = _log_queue.get(timeout=max(0, deadline - time.monotonic()))
+        except queue.Empty:
+            line = None
+
+        if line is _LOG_STOP:
+            write_log_batch(batch)
+            return
+        if line is not None:
+            batch.append(line)
+
+        if len(batch) >= LOG_FLUSH_RECORDS or time.monotonic() >= deadline:
+            write_log_batch(batch)
+            batch = []
+            deadline = time.monotonic() + LOG_FLUSH_SECONDS
+
+
+atexit.register(stop_log_writer)
+
+
+# 1.1 Stage instrumentation
+#
+# - @instrument("stage") records, for every call of a pipeline stage:
+#   wall time, CPU time, change in resident memory (RSS), rows in and
+#   rows out
+# - Records are JSON lines written through one buffered file handle
+#   (METRICS_PATH), flushed at the end of main()
+# - With ETL_PROFILE=1 (or main(profile=True)) the run also collects a
+#   cProfile dump (PROFILE_PATH) and the tracemalloc peak of each stage
+# - rss_delta_mb is what the stage kept (temporaries freed before it
+#   returns do not show); use the tracemalloc peak for the stage's peak.
+#   ru_maxrss is not used: it is the peak of the whole process, so every
+#   stage after the biggest one would report the same number
+# - A stage's peak includes the stages it calls, and a nested stage does
+#   not hide the peak its caller reached before calling it
+#
+
+_metrics_file = None
+_metrics_lock = threading.Lock()
+
+
+def write_metric(record):
+    global _metrics_file
+    with _metrics_lock:
+        if _metrics_file is None:
+            _metrics_file = open(METRICS_PATH, "a", encoding="utf-8", buffering=64 * 1024)
+        _metrics_file.write(json.dumps(record) + "\n")
+
+
+def flush_metrics():
+    global _metrics_file
+    with _metrics_lock:
+        if _metrics_file is not None:
+            _metrics_file.close()
+            _metrics_file = None
+
+
+def count_rows(obj):
+    if isinstance(obj, pd.DataFrame):
+        return len(obj)
+    if isinstance(obj, dict):
+        obj = list(obj.values())
+    if not isinstance(obj, (list, tuple)):
+        return None
+
+    counts = [count_rows(item) for item in obj]
+    counts = [count for count in counts if count is not None]
+    return sum(counts) if counts else None
+
+
+def current_rss_mb():
+    # Resident memory right now; /proc only exists on Linux
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+# Running traced peak of every open stage. A stage resets the tracemalloc
+# peak when it starts, so the peak reached so far by the stage that called
+# it is saved here first and folded back in when it ends.
+_peak_stack = []
+
+
+def start_peak():
+    if _peak_stack:
+        _peak_stack[-1] = max(_peak_stack[-1], tracemalloc.get_traced_memory()[1])
+    _peak_stack.append(0)
+    tracemalloc.reset_peak()
+
+
+def end_peak():
+    peak = max(_peak_stack.pop(), tracemalloc.get_traced_memory()[1])
+    if _peak_stack:
+        _peak_stack[-1] = max(_peak_stack[-1], peak)
+    return peak
+
+
+def instrument(stage):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            rows_in = count_rows(list(args) + list(kwargs.values()))
+            traced = tracemalloc.is_tracing()
+            if traced:
+                start_peak()
+            rss_start = current_rss_mb()
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+
+            result = None
+            status = "error"
+            try:
+                result = func(*args, **kwargs)
+                status = "ok"
+                return result
+            finally:
+                record = {
+                    "timestamp": datetime.now().isoformat(timespec="seconds"),
+                    "stage": stage,
+                    "status": status,
+                    "wall_s": round(time.perf_counter() - wall_start, 6),
+                    "cpu_s": round(time.process_time() - cpu_start, 6),
+                    "rows_in": rows_in,
+                    "rows_out": count_rows(result),
+                }
+                rss_end = current_rss_mb()
+                if rss_start is not None and rss_end is not None:
+                    record["rss_mb"] = round(rss_end, 1)
+                    record["rss_delta_mb"] = round(rss_end - rss_start, 1)
+                if traced:
+                    record["peak_traced_mb"] = round(end_peak() / 1024 / 1024, 3)
+                write_metric(record)
+
+        return wrapper
+    return decorator
 
 
 # 2. BASIC VALIDATIONS
@@ -66,7 +521,154 @@
 #       - Check if numeric columns are actually numeric
 #       - Check if emails have a valid format
 #
-# YOUR CODE HERE
+
+def validate_df(df, required_columns):
+    missing = [col for col in required_columns if col not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {missing}")
+
+    if df.empty:
+        raise ValueError("The DataFrame is empty.")
+
+    return True
+
+
+# 2.1 Row-level validation engine
+#
+# - VALIDATION_RULES is compiled once into named checks; every check is a
+#   vectorized operation over a whole column (one str.fullmatch with a
+#   precompiled pattern, numeric range masks), never a Python loop
+# - validate_sample(df) checks a random sample and returns the estimated
+#   invalid rate of each check (fast, for interactive runs)
+# - quarantine_invalid_rows(df) checks every row, appends the invalid ones
+#   to QUARANTINE_PATH with the names of the failed checks, and returns
+#   the valid rows instead of raising on the first problem
+# - Checks see the rows before anything coerces or drops them: a typed read
+#   that turns "abc" into a null age records age_not_numeric in the
+#   INVALID_COLUMN of that row, and rows without email are only dropped
+#   after validation (email_missing)
+#
+
+def out_of_range(values, low, high):
+    # Nulls are not out of range (not_null covers them)
+    return (values.notna() & ~values.between(low, high)).fillna(False)
+
+
+def compile_validation_rules(rules):
+    checks = {}
+
+    for column, rule in rules.items():
+        if rule.get("not_null"):
+            checks[f"{column}_missing"] = (column, lambda s: s.isna())
+
+        if "pattern" in rule:
+            pattern = rule["pattern"]
+            checks[f"{column}_format"] = (
+                column,
+                lambda s, pattern=pattern: s.notna() & ~s.astype("string").str.fullmatch(pattern).fillna(False),
+            )
+
+        if rule.get("numeric"):
+            checks[f"{column}_not_numeric"] = (
+                column,
+                lambda s: s.notna() & pd.to_numeric(s, errors="coerce").isna(),
+            )
+
+        if "min" in rule or "max" in rule:
+            low, high = rule.get("min", -np.inf), rule.get("max", np.inf)
+            checks[f"{column}_out_of_range"] = (
+                column,
+                lambda s, low=low, high=high: out_of_range(pd.to_numeric(s, errors="coerce"), low, high),
+            )
+
+    return checks
+
+
+def mark_invalid(df, mask, check):
+    if not mask.any():
+        return df
+    previous = df[INVALID_COLUMN] if INVALID_COLUMN in df.columns else pd.Series(pd.NA, index=df.index, dtype="string")
+    marked = (previous.fillna("") + ";" + check).str.lstrip(";")
+    df[INVALID_COLUMN] = marked.where(mask, previous)
+    return df
+
+
+def invalid_masks(df, checks):
+    masks = {
+        name: func(df[column]).to_numpy(dtype=bool)
+        for name, (column, func) in checks.items()
+        if column in df.columns
+    }
+
+    if INVALID_COLUMN in df.columns:
+        recorded = ";" + df[INVALID_COLUMN].astype("string").fillna("") + ";"
+        for name in set(";".join(recorded.unique()).split(";")) - {""}:
+            hit = recorded.str.contains(f";{name};", regex=False).to_numpy(dtype=bool)
+            masks[name] = masks[name] | hit if name in masks else hit
+
+    return pd.DataFrame(masks, index=df.index)
+
+
+def validate_sample(df, checks=None, sample_size=None, max_invalid_rate=None):
+    checks = checks or COMPILED_VALIDATION
+    sample_size = sample_size or VALIDATION_SAMPLE_SIZE
+    max_invalid_rate = VALIDATION_MAX_INVALID_RATE if max_invalid_rate is None else max_invalid_rate
+
+    sample = df.sample(n=sample_size, random_state=0) if len(df) > sample_size else df
+    rates = invalid_masks(sample, checks).mean().round(4).to_dict()
+
+    failing = {name: rate for name, rate in rates.items() if rate > 0}
+    if failing:
+        log(f"Validation sample ({len(sample)} rows) invalid rates: {failing}")
+
+    if max_invalid_rate is not None:
+        too_high = {name: rate for name, rate in rates.items() if rate > max_invalid_rate}
+        if too_high:
+            raise ValueError(f"Invalid rows above {max_invalid_rate:.0%}: {too_high}")
+
+    return rates
+
+
+def reset_quarantine(path=None):
+    path = path or QUARANTINE_PATH or os.path.join(OUTPUT_DIR, "quarantine.csv")
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def quarantine_invalid_rows(df, checks=None, path=None):
+    checks = checks or COMPILED_VALIDATION
+    path = path or QUARANTINE_PATH or os.path.join(OUTPUT_DIR, "quarantine.csv")
+
+    masks = invalid_masks(df, checks)
+    invalid = masks.any(axis=1)
+    if not invalid.any():
+        return df
+
+    # Reasons are only built for the (few) invalid rows
+    bad = masks[invalid]
+    df_bad = df[invalid].drop(columns=INVALID_COLUMN, errors="ignore").assign(failed_checks=bad.apply(lambda row: ";".join(row.index[row]), axis=1))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df_bad.to_csv(path, mode="a", header=not os.path.exists(path), index=False)
+    log(f"Quarantined {len(df_bad)} invalid rows")
+
+    return df[~invalid].reset_index(drop=True)
+
+
+def apply_validation(df, mode=None):
+    mode = mode or VALIDATION_MODE
+    if mode == "sample":
+        validate_sample(df)
+    elif mode == "full":
+        df = quarantine_invalid_rows(df)
+
+    # Rows without email are never loaded; in full mode they are already
+    # in the quarantine (email_missing)
+    df = df.drop(columns=INVALID_COLUMN, errors="ignore")
+    return df.dropna(subset=["email"]).reset_index(drop=True)
+
+
+COMPILED_VALIDATION = compile_validation_rules(VALIDATION_RULES)
 
 
 # 3. EXTRACT
@@ -101,7 +703,384 @@
 #             "api": df_api
 #           }
 #
-# YOUR CODE HERE
+# 3.5 Concurrent extraction
+#       - Every source is registered in EXTRACT_SOURCES as
+#         name -> (function, argument)
+#       - extract_all() runs all of them at the same time on a thread
+#         pool, so local file parsing overlaps with the API round-trip
+#       - Each source has its own timeout (SOURCE_TIMEOUTS); a source
+#         that does not finish in time raises TimeoutError
+#
+# 3.6 Streaming mode
+#       - extract_csv_chunks(path, chunksize) yields DataFrames of
+#         `chunksize` rows instead of reading the whole file
+#       - extract_all(chunksize=N) returns that iterator under "csv";
+#         json and api stay as small lookup DataFrames
+#
+# 3.7 Paginated API extraction
+#       - extract_api() reads the first page, then uses `total`, `skip`
+#         and `limit` from the response to request the remaining pages
+#       - The remaining pages are fetched concurrently (API_MAX_WORKERS)
+#         through one pooled session that retries with backoff
+#       - Each page is turned into a DataFrame as soon as it arrives, so
+#         the raw JSON of all pages is never held at once
+#
+# 3.8 API response cache
+#       - Every page is stored in CACHE_DIR, keyed by URL + params
+#       - Entries younger than CACHE_TTL are served without a request;
+#         older ones are revalidated with If-None-Match/If-Modified-Since
+#         and a 304 answer reuses the stored body
+#       - When the folder grows over CACHE_MAX_BYTES the least recently
+#         used entries are deleted
+#       - CACHE_MODE "offline" serves only from the cache (CI, reruns);
+#         production can set ETL_CACHE_TTL=0 to send only conditional GETs
+#
+# 3.9 Incremental extraction
+#       - STATE_PATH stores the newest value seen in each source's
+#         watermark column (WATERMARK_COLUMNS)
+#       - select_new_rows() keeps the rows at or after that value and
+#         returns the watermarks to store once the run succeeds; signup_date
+#         only has day precision, so rows added later on the watermark day
+#         must not be skipped (rows already loaded are replaced, see 4.7)
+#       - save_state() writes a temporary file and renames it, so the
+#         state is either the old one or the new one, never half-written
+#
+# 3.10 Columnar readers
+#       - extract_parquet(path, columns, filters) reads a Parquet file or a
+#         partitioned folder written by load_all(columnar=True)
+#       - Only the requested columns are read, and `filters` skip whole
+#         partitions, e.g. [("country", "==", "Spain")]
+#       - Rows written without a partition value (__HIVE_DEFAULT_PARTITION__)
+#         come back with a null key
+#       - extract_feather(path, columns) does the same for Arrow IPC files
+#
+# 3.11 Typed reading
+#       - extract_csv() and extract_json() take their dtypes from SCHEMAS
+#         instead of letting pandas infer them (one pass, smaller types)
+#       - `columns` reads only part of the schema (usecols)
+#       - "numeric" and "flag" columns are read as strings and cast by
+#         cast_text_columns(), so one dirty value ("n/a ") becomes a null
+#         instead of aborting the run
+#       - CSVs are parsed with the pyarrow engine when it is installed;
+#         the chunked reader stays on the C engine, which supports chunks
+#
+
+def schema_read_args(schema, columns=None):
+    columns = [col for col in (columns or schema) if col in schema]
+    dtypes = {
+        col: "string" if schema[col] in TEXT_CAST_TYPES else schema[col]
+        for col in columns if schema[col] != "datetime"
+    }
+    dates = [col for col in columns if schema[col] == "datetime"]
+    return columns, dtypes, dates
+
+
+def cast_text_columns(df, schema):
+    for col in df.columns:
+        kind = schema.get(col)
+        if kind not in TEXT_CAST_TYPES:
+            continue
+        text = df[col].astype("string").str.strip()
+        if kind == "numeric":
+            df[col] = pd.to_numeric(text, errors="coerce", downcast="integer")
+            # Validation only sees the null this cast leaves behind
+            if VALIDATION_RULES.get(col, {}).get("numeric"):
+                mark_invalid(df, text.fillna("").ne("") & df[col].isna(), f"{col}_not_numeric")
+        else:
+            df[col] = text.str.lower().map(FLAG_VALUES).astype("boolean")
+    return df
+
+
+def required_subset(required_columns, columns):
+    return [col for col in required_columns if columns is None or col in columns]
+
+
+
+def extract_csv(path, columns=None, schema="users"):
+    usecols, dtypes, dates = schema_read_args(SCHEMAS[schema], columns)
+    df = pd.read_csv(path, usecols=usecols, dtype=dtypes, parse_dates=dates, engine=CSV_ENGINE)
+    df = cast_text_columns(df, SCHEMAS[schema])
+    validate_df(df, required_subset(CSV_REQUIRED_COLUMNS, columns))
+    return df
+
+
+def extract_csv_chunks(path, chunksize=CHUNK_SIZE, columns=None, schema="users"):
+    usecols, dtypes, dates = schema_read_args(SCHEMAS[schema], columns)
+    with pd.read_csv(path, usecols=usecols, dtype=dtypes, parse_dates=dates, chunksize=chunksize) as reader:
+        for i, chunk in enumerate(reader):
+            chunk = cast_text_columns(chunk, SCHEMAS[schema])
+            if i == 0:
+                validate_df(chunk, required_subset(CSV_REQUIRED_COLUMNS, columns))
+            yield chunk
+
+
+def extract_json(path, columns=None, schema="users_extra"):
+    usecols, dtypes, dates = schema_read_args(SCHEMAS[schema], columns)
+    df = pd.read_json(path, dtype=dtypes, convert_dates=dates, precise_float=True)
+    df = cast_text_columns(df[[col for col in usecols if col in df.columns]], SCHEMAS[schema])
+    validate_df(df, required_subset(JSON_REQUIRED_COLUMNS, columns))
+    return df
+
+
+def hive_partitioning(path):
+    # Rows without a partition value sit in __HIVE_DEFAULT_PARTITION__; with
+    # inferred (dictionary) keys pyarrow can't unify that null with the other
+    # folders, so the key is read with an explicit type instead
+    keys = {}
+    for name in os.listdir(path):
+        if "=" in name and os.path.isdir(os.path.join(path, name)):
+            key, value = name.split("=", 1)
+            keys.setdefault(key, []).append(value)
+
+    if not keys:
+        return None
+
+    fields = []
+    for key, values in keys.items():
+        values = [v for v in values if v != HIVE_DEFAULT_PARTITION]
+        is_int = bool(values) and all(v.lstrip("-").isdigit() for v in values)
+        fields.append((key, pa.int64() if is_int else pa.string()))
+
+    import pyarrow.dataset as ds
+    return ds.partitioning(pa.schema(fields), flavor="hive")
+
+
+def extract_parquet(path, columns=None, filters=None):
+    partitioning = hive_partitioning(path) if os.path.isdir(path) else None
+    df = pd.read_parquet(path, engine="pyarrow", columns=columns, filters=filters,
+                         partitioning=partitioning or "hive")
+    if partitioning is not None:
+        for key in partitioning.schema.names:
+            if key in df.columns:
+                df[key] = df[key].astype("Int64" if pa.types.is_integer(
+                    partitioning.schema.field(key).type) else "string")
+    return df
+
+
+def extract_feather(path, columns=None):
+    return pd.read_feather(path, columns=columns)
+
+
+def create_session(pool_size=API_MAX_WORKERS, retries=API_RETRIES, backoff=API_BACKOFF):
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def cache_key(url, params):
+    raw = json.dumps([url, sorted((params or {}).items())], default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def read_cache(key):
+    path = os.path.join(CACHE_DIR, f"{key}.json")
+    try:
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    # The file's mtime is the "last used" time for LRU eviction
+    os.utime(path)
+    return entry
+
+
+def write_cache(key, entry):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"{key}.json")
+    tmp_path = f"{path}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, path)
+
+    evict_cache()
+
+
+def evict_cache(max_bytes=None):
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    files = []
+    for name in os.listdir(CACHE_DIR):
+        if not name.endswith(".json"):
+            continue
+        try:
+            stat = os.stat(os.path.join(CACHE_DIR, name))
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, name in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(CACHE_DIR, name))
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def fetch_page(session, url, params, timeout, mode=None, ttl=None):
+    mode = mode or CACHE_MODE
+    ttl = CACHE_TTL if ttl is None else ttl
+
+    key = cache_key(url, params)
+    entry = read_cache(key) if mode != "off" else None
+
+    if mode == "offline":
+        if entry is None:
+            raise ValueError(f"No cached response for {url} {params} (offline mode)")
+        return entry["body"]
+
+    if entry and time.time() - entry["fetched_at"] < ttl:
+        return entry["body"]
+
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    response = session.get(url, params=params, headers=headers, timeout=timeout)
+
+    if response.status_code == 304 and entry:
+        entry["fetched_at"] = time.time()
+        write_cache(key, entry)
+        return entry["body"]
+
+    if response.status_code != 200:
+        raise ValueError(f"API request failed with status code {response.status_code}")
+
+    body = response.json()
+    if mode != "off":
+        write_cache(key, {
+            "url": url,
+            "params": params,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+            "body": body,
+        })
+    return body
+
+
+def extract_api(url, timeout=SOURCE_TIMEOUTS["api"], max_workers=API_MAX_WORKERS, records_key="users"):
+    base_url, _, query = url.partition("?")
+    params = dict(parse_qsl(query))
+    page_size = int(params.pop("limit", API_PAGE_SIZE))
+
+    with create_session(pool_size=max_workers) as session:
+        # 1. First page tells us how many records there are
+        first = fetch_page(session, base_url, {**params, "limit": page_size, "skip": 0}, timeout)
+        total = first.get("total", len(first[records_key]))
+        limit = first.get("limit") or len(first[records_key])
+        pages = {0: pd.json_normalize(first[records_key])}
+        del first
+
+        # 2. Remaining pages in parallel, converted as they arrive
+        skips = range(limit, total, limit) if limit > 0 else []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(fetch_page, session, base_url, {**params, "limit": limit, "skip": skip}, timeout): skip
+                for skip in skips
+            }
+            for future in as_completed(futures):
+                pages[futures[future]] = pd.json_normalize(future.result()[records_key])
+
+    df = pd.concat([pages[skip] for skip in sorted(pages)], ignore_index=True)
+    validate_df(df, API_REQUIRED_COLUMNS)
+    return df
+
+
+def load_state(path=None):
+    path = path or STATE_PATH
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state, path=None):
+    path = path or STATE_PATH
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def select_new_rows(data, state):
+    delta = {}
+    new_state = dict(state)
+
+    for name, df in data.items():
+        column = WATERMARK_COLUMNS.get(name)
+        if column is None or column not in df.columns:
+            delta[name] = df
+            continue
+
+        values = pd.to_datetime(df[column], errors="coerce", utc=True)
+        watermark = state.get(name)
+        if watermark is not None:
+            df = df[values >= pd.Timestamp(watermark)]
+
+        delta[name] = df
+        if values.notna().any():
+            newest = values.max()
+            if watermark is None or newest > pd.Timestamp(watermark):
+                new_state[name] = newest.isoformat()
+
+    return delta, new_state
+
+
+EXTRACT_SOURCES = {
+    "csv": (extract_csv, CSV_PATH),
+    "json": (extract_json, JSON_PATH),
+    "api": (extract_api, API_URL),
+}
+
+
+@instrument("extract_all")
+def extract_all(sources=None, timeouts=None, chunksize=None):
+    sources = dict(sources or EXTRACT_SOURCES)
+    if chunksize and "csv" in sources:
+        sources["csv"] = (partial(extract_csv_chunks, chunksize=chunksize), sources["csv"][1])
+    timeouts = {**SOURCE_TIMEOUTS, **(timeouts or {})}
+
+    executor = ThreadPoolExecutor(max_workers=len(sources))
+    start = time.monotonic()
+
+    try:
+        # 1. Launch every source at once
+        futures = {
+            name: executor.submit(func, arg)
+            for name, (func, arg) in sources.items()
+        }
+
+        # 2. Collect each result within its own deadline
+        data = {}
+        for name, future in futures.items():
+            deadline = start + timeouts.get(name, 60)
+            remaining = max(0, deadline - time.monotonic())
+            try:
+                data[name] = future.result(timeout=remaining)
+            except TimeoutError:
+                raise TimeoutError(f"Source '{name}' did not finish in {timeouts.get(name, 60)}s")
+            log(f"Extracted {name}: {getattr(data[name], 'shape', 'streaming')}")
+    finally:
+        # Do not wait for a source that already timed out
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return data
 
 
 # 4. TRANSFORM
@@ -137,7 +1116,967 @@
 #           normalize → standardize → combine → enrich
 #       - Return df_final
 #
-# YOUR CODE HERE
+# 4.6 Streaming mode
+#       - When data_dict["csv"] is an iterator of chunks, transform_all()
+#         returns a generator that runs the same sequence chunk by chunk
+#       - Duplicates across chunks are found with the dedup index (4.8),
+#         so neither rows nor keys pile up in memory
+#
+# 4.7 Incremental mode
+#       - transform_incremental() transforms only the new rows and merges
+#         them into the previous final_users.csv
+#       - New CSV rows replace previous rows with the same email or
+#         user_id (rows on the watermark day are read again every run);
+#         those rows are found through the dedup index (4.8), so the
+#         previous output is not hashed again
+#       - New JSON rows (recent last_login) update the extra attributes
+#         of users that are already in the output
+#       - The API has no watermark column, so it is only refreshed by
+#         full runs (or the first incremental run); later incremental runs
+#         do not even fetch it
+#       - The previous output is read back with FINAL_DTYPES, so an
+#         incremental run writes the same types as a full run
+#
+# 4.8 Deduplication
+#       - Two keys per row, hashed to 64 bits: the stripped, lowercase
+#         email and the user_id inside its source (ids from different
+#         sources are different users); a row is a duplicate when either
+#         key was already kept
+#       - Survivorship: rows are ordered by SURVIVORSHIP before the
+#         duplicate check, so the first source in that list wins
+#       - In streaming mode the hashes live in a SQLite index on disk
+#         (DEDUP_INDEX_PATH), which can grow larger than RAM; the
+#         sources are also streamed in SURVIVORSHIP order; eager full
+#         runs keep the hashes in memory and do not touch the index
+#       - The index is kept across runs: dedup_runs records every run
+#         (mode, times, rows kept and dropped) and each key the run that
+#         kept it. Full runs clear the keys, since they rebuild the whole
+#         output; incremental runs only add the new keys and remove the
+#         replaced ones
+#       - The incremental state stores the last run id; when it does not
+#         match the index (e.g. the load failed), the keys are rebuilt
+#         from the previous output
+#       - Every dropped row is appended to DEDUP_REPORT_PATH together
+#         with the source that won
+#
+# 4.9 Lazy pipeline
+#       - lazy_transform(columns, filters) only declares the pipeline as a
+#         DAG of nodes ({"op", "inputs", ...}); nothing is read yet
+#       - The JSON extras are joined after the deduplication (the dedup key
+#         does not come from them), so the join only sees surviving rows
+#       - optimize_plan() rewrites the DAG before it runs:
+#           * projection pushdown: every scan reads only the source columns
+#             that the output, the filters and the dedup key need, and the
+#             JSON source is not read at all when no extra column is needed
+#           * predicate pushdown: filters on PUSHDOWN_COLUMNS run right after
+#             standardize, before the join and enrich(); the rest run after
+#             enrich()
+#       - Rows removed by a pushed-down filter still take part in the
+#         deduplication, so the result is the same as filtering at the end
+#       - collect(plan) runs the DAG; load_all() calls it, so nothing is
+#         materialized before the load phase
+#
+# 4.10 Join engine
+#       - join_frames(left, right, on, how) replaces pd.merge for the
+#         users + extras join ("left" or "inner"; null keys never match)
+#       - Keys are factorized to integer codes once, so the join itself
+#         only compares integers, whatever the key dtype
+#       - Strategy, picked from the inputs:
+#           * sort_merge: both keys already sorted (binary search, no
+#             factorize)
+#           * broadcast: small right side with unique keys (one array
+#             lookup per left row)
+#           * hash: anything else (right rows grouped by code, then probed)
+#       - Inputs over JOIN_MEMORY_BUDGET (measured with deep=True) are
+#         split by key code into JOIN_PARTITIONS pickles in JOIN_SPILL_DIR,
+#         one partition copy at a time, and joined partition by partition;
+#         each partition's output goes back to disk, and the result is put
+#         back in left row order one column at a time
+#       - Every join logs its strategy and cardinality (one_to_one ...
+#         many_to_many) and the row fan-out; `validate` raises ValueError
+#         when the observed cardinality is wider than expected
+#
+# 4.11 Partitioned enrich
+#       - enrich_partitioned(df) splits the rows into TRANSFORM_PARTITIONS
+#         row ranges (or by a hash of user_id) and runs enrich() on a fork
+#         process pool
+#       - The workers inherit the input DataFrame through fork (no
+#         pickling) and return their result as an Arrow IPC stream in a
+#         shared memory block
+#       - The parts are concatenated back in the original row order, so
+#         the result is identical to enrich(df)
+#
+
+@instrument("normalize_columns")
+def normalize_columns(df):
+    return df.rename(columns=lambda col: str(col).strip().lower().replace(" ", "_"))
+
+
+def factorize_keys(left_key, right_key):
+    codes, uniques = pd.factorize(pd.concat([left_key, right_key], ignore_index=True))
+    return codes[:len(left_key)], codes[len(left_key):], len(uniques)
+
+
+def is_sorted_key(key):
+    return pd.api.types.is_numeric_dtype(key) and key.notna().all() and key.is_monotonic_increasing
+
+
+def choose_join_strategy(left_key, right_key):
+    if is_sorted_key(left_key) and is_sorted_key(right_key):
+        return "sort_merge"
+    if len(right_key) <= BROADCAST_MAX_ROWS:
+        return "broadcast"
+    return "hash"
+
+
+def expand_matches(starts, matches, right_order, how):
+    # One output row per (left row, matching right row); unmatched left rows
+    # are kept once in a left join, with right index -1
+    out_counts = np.maximum(matches, 1) if how == "left" else matches
+    left_idx = np.repeat(np.arange(len(matches)), out_counts)
+
+    offsets = np.arange(len(left_idx)) - np.repeat(np.cumsum(out_counts) - out_counts, out_counts)
+    matched = matches[left_idx] > 0
+    right_idx = np.full(len(left_idx), -1, dtype=np.int64)
+    right_idx[matched] = right_order[starts[left_idx[matched]] + offsets[matched]]
+    return left_idx, right_idx
+
+
+def join_indexer(left_key, right_key, how, strategy):
+    if strategy == "sort_merge":
+        left_values, right_values = left_key.to_numpy(), right_key.to_numpy()
+        starts = np.searchsorted(right_values, left_values, side="left")
+        matches = np.searchsorted(right_values, left_values, side="right") - starts
+        left_idx, right_idx = expand_matches(starts, matches, np.arange(len(right_values)), how)
+        left_many = bool(np.any(np.diff(left_values[matches > 0]) == 0))
+        return left_idx, right_idx, matches, left_many
+
+    left_codes, right_codes, n_keys = factorize_keys(left_key, right_key)
+    has_key = left_codes >= 0
+    safe_codes = np.where(has_key, left_codes, 0)
+    right_counts = np.bincount(right_codes[right_codes >= 0], minlength=n_keys)
+    matches = np.where(has_key, right_counts[safe_codes] if n_keys else 0, 0)
+    left_many = bool(np.bincount(left_codes[matches > 0], minlength=n_keys).max(initial=0) > 1)
+
+    if strategy == "broadcast" and right_counts.max(initial=0) <= 1:
+        position = np.full(n_keys, -1, dtype=np.int64)
+        valid = right_codes >= 0
+        position[right_codes[valid]] = np.flatnonzero(valid)
+        right_idx = np.where(has_key, position[safe_codes] if n_keys else -1, -1)
+        left_idx = np.arange(len(left_codes))
+        if how == "inner":
+            left_idx, right_idx = left_idx[right_idx >= 0], right_idx[right_idx >= 0]
+        return left_idx, right_idx, matches, left_many
+
+    # Hash: group the right rows by code, keeping their order inside a key
+    right_order = np.argsort(np.where(right_codes >= 0, right_codes, n_keys), kind="stable")
+    starts = np.cumsum(right_counts) - right_counts
+    left_idx, right_idx = expand_matches(starts[safe_codes] if n_keys else safe_codes, matches, right_order, how)
+    return left_idx, right_idx, matches, left_many
+
+
+def take_rows(df, indexer):
+    # -1 means "no match": those rows get nulls (ints become floats, as in pd.merge)
+    return pd.DataFrame({
+        col: pd.api.extensions.take(df[col].array, indexer, allow_fill=True)
+        for col in df.columns
+    })
+
+
+def build_join_result(left, right, on, left_idx, right_idx, suffixes=("_x", "_y")):
+    df_left = left.iloc[left_idx].reset_index(drop=True)
+    df_right = take_rows(right.drop(columns=on), right_idx)
+
+    overlap = df_left.columns.intersection(df_right.columns)
+    if len(overlap):
+        df_left = df_left.rename(columns={col: col + suffixes[0] for col in overlap})
+        df_right = df_right.rename(columns={col: col + suffixes[1] for col in overlap})
+    return pd.concat([df_left, df_right], axis=1)
+
+
+def report_join(report, validate=None):
+    log(f"Join {report['strategy']}: {report['cardinality']}, {report['left_rows']} x {report['right_rows']} "
+        f"-> {report['output_rows']} rows (fan-out {report['fanout']})")
+    if report["cardinality"] == "many_to_many":
+        log(f"WARNING: many-to-many join on '{report['on']}'")
+    write_metric({"timestamp": datetime.now().isoformat(timespec="seconds"), "stage": "join_report", **report})
+
+    allowed = {
+        "one_to_one": {"one_to_one"},
+        "one_to_many": {"one_to_one", "one_to_many"},
+        "many_to_one": {"one_to_one", "many_to_one"},
+    }
+    if validate and report["cardinality"] not in allowed.get(validate, {report["cardinality"]}):
+        raise ValueError(f"Join on '{report['on']}' is {report['cardinality']}, expected {validate}")
+
+
+def spill_partitions(df, codes, partitions, spill_dir, side):
+    # One partition copy at a time, rows kept in their original order
+    parts = codes % partitions
+    order = np.argsort(parts, kind="stable")
+    bounds = np.searchsorted(parts[order], np.arange(partitions + 1))
+
+    for part in range(partitions):
+        rows = order[bounds[part]:bounds[part + 1]]
+        if len(rows):
+            df_part = df.iloc[rows].assign(_key=codes[rows], _row=rows)
+            df_part.to_pickle(os.path.join(spill_dir, f"{side}_{part}.pkl"))
+
+
+def spill_join(left, right, on, how, strategy, partitions, spill_dir):
+    # Partition both sides by key code, so every key lands in one partition
+    left_codes, right_codes, _ = factorize_keys(left[on], right[on])
+    right_empty = right.iloc[:0].assign(_key=right_codes[:0], _row=np.arange(0))
+
+    if os.path.exists(spill_dir):
+        shutil.rmtree(spill_dir)
+    os.makedirs(spill_dir)
+
+    try:
+        spill_partitions(left, left_codes, partitions, spill_dir, "left")
+        spill_partitions(right, right_codes, partitions, spill_dir, "right")
+        del left_codes, right_codes
+
+        # Each partition's output goes back to disk, so only one is in memory
+        matches, left_many, done = [], False, []
+        for part in range(partitions):
+            left_path = os.path.join(spill_dir, f"left_{part}.pkl")
+            right_path = os.path.join(spill_dir, f"right_{part}.pkl")
+            if not os.path.exists(left_path):
+                continue
+            df_left = pd.read_pickle(left_path)
+            df_right = pd.read_pickle(right_path) if os.path.exists(right_path) else right_empty
+
+            # Null keys (code -1) must not match each other
+            left_key = df_left["_key"].where(df_left["_key"] >= 0)
+            right_key = df_right["_key"].where(df_right["_key"] >= 0)
+            left_idx, right_idx, part_matches, part_many = join_indexer(left_key, right_key, how, strategy)
+            df_part = build_join_result(df_left.drop(columns="_key"), df_right.drop(columns=["_key", "_row"]),
+                                        on, left_idx, right_idx)
+            df_part.to_pickle(os.path.join(spill_dir, f"out_{part}.pkl"))
+
+            matches.append(part_matches)
+            left_many = left_many or part_many
+            done.append(part)
+            del df_left, df_right, df_part
+
+        parts = [pd.read_pickle(os.path.join(spill_dir, f"out_{part}.pkl")) for part in done]
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    # Back to the left row order, one column at a time (no second full copy)
+    order = np.argsort(np.concatenate([df_part.pop("_row").to_numpy() for df_part in parts]), kind="stable")
+    columns = {}
+    for col in parts[0].columns:
+        columns[col] = pd.concat([df_part.pop(col) for df_part in parts], ignore_index=True).take(order)
+        columns[col] = columns[col].reset_index(drop=True)
+    df = pd.DataFrame(columns)
+
+    matches = np.concatenate(matches) if matches else np.array([], dtype=np.int64)
+    return df, matches, left_many
+
+
+@instrument("join_frames")
+def join_frames(left, right, on, how="left", strategy=None, validate=None, memory_budget=None):
+    if how not in ("left", "inner"):
+        raise ValueError(f"Unsupported join type: {how}")
+    memory_budget = JOIN_MEMORY_BUDGET if memory_budget is None else memory_budget
+    strategy = strategy or choose_join_strategy(left[on], right[on])
+    # deep=True: string columns count with their values, not just pointers
+    input_bytes = left.memory_usage(deep=True).sum() + right.memory_usage(deep=True).sum()
+
+    if input_bytes > memory_budget and len(left) and len(right):
+        spill_dir = JOIN_SPILL_DIR or os.path.join(OUTPUT_DIR, "join_spill")
+        df, matches, left_many = spill_join(left, right, on, how, "hash", JOIN_PARTITIONS, spill_dir)
+        strategy = f"spilled_hash[{JOIN_PARTITIONS}]"
+    else:
+        left_idx, right_idx, matches, left_many = join_indexer(left[on], right[on], how, strategy)
+        df = build_join_result(left, right, on, left_idx, right_idx)
+        if strategy == "broadcast" and matches.max(initial=0) > 1:
+            strategy = "hash"
+
+    report = {
+        "on": on,
+        "how": how,
+        "strategy": strategy,
+        "left_rows": len(left),
+        "right_rows": len(right),
+        "output_rows": len(df),
+        "matched_left_rows": int((matches > 0).sum()),
+        "cardinality": f"{'many' if left_many else 'one'}_to_{'many' if matches.max(initial=0) > 1 else 'one'}",
+        "fanout": round(len(df) / len(left), 3) if len(left) else None,
+    }
+    report_join(report, validate)
+    return df
+
+
+@instrument("standardize_structures")
+def standardize_structures(data_sources):
+    dfs = []
+
+    if "csv" in data_sources:
+        df_csv = data_sources["csv"][[col for col in CSV_COLUMNS + [INVALID_COLUMN] if col in data_sources["csv"].columns]]
+        if "json" in data_sources:
+            df_extra = data_sources["json"][[col for col in EXTRA_COLUMNS if col in data_sources["json"].columns]]
+            df_csv = join_frames(df_csv, df_extra, on="user_id", how="left")
+        dfs.append(df_csv.assign(source="csv"))
+
+    if "api" in data_sources:
+        df_api = data_sources["api"]
+        df_api = df_api[[col for col in API_COLUMN_MAP if col in df_api.columns]].rename(columns=API_COLUMN_MAP)
+        dfs.append(df_api.assign(source="api"))
+
+    return dfs
+
+
+def open_dedup_index(path=None):
+    path = path or DEDUP_INDEX_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    index = sqlite3.connect(path)
+    index.execute(
+        "CREATE TABLE IF NOT EXISTS dedup_runs (run_id INTEGER PRIMARY KEY, mode TEXT, "
+        "started_at TEXT, finished_at TEXT, rows_kept INTEGER, rows_dropped INTEGER)"
+    )
+    index.execute(
+        "CREATE TABLE IF NOT EXISTS dedup_keys (key INTEGER PRIMARY KEY, source TEXT, "
+        "user_id INTEGER, run_id INTEGER)"
+    )
+    index.execute("CREATE TEMP TABLE batch_keys (key INTEGER PRIMARY KEY)")
+    return index
+
+
+def last_dedup_run(index):
+    return index.execute("SELECT MAX(run_id) FROM dedup_runs").fetchone()[0]
+
+
+def start_dedup_run(index, mode):
+    # A full run rebuilds the whole output: keys kept by earlier runs would
+    # drop every row as already seen, so only their history is kept
+    if mode != "incremental":
+        index.execute("DELETE FROM dedup_keys")
+    cursor = index.execute(
+        "INSERT INTO dedup_runs (mode, started_at, rows_kept, rows_dropped) VALUES (?, ?, 0, 0)",
+        (mode, datetime.now().isoformat(timespec="seconds")),
+    )
+    index.commit()
+    return cursor.lastrowid
+
+
+def count_dedup_rows(index, run_id, kept, dropped):
+    index.execute(
+        "UPDATE dedup_runs SET rows_kept = rows_kept + ?, rows_dropped = rows_dropped + ? WHERE run_id = ?",
+        (int(kept), int(dropped), run_id),
+    )
+    index.commit()
+
+
+def finish_dedup_run(index, run_id):
+    index.execute("UPDATE dedup_runs SET finished_at = ? WHERE run_id = ?",
+                  (datetime.now().isoformat(timespec="seconds"), run_id))
+    index.commit()
+
+
+def lookup_keys(index, hashes):
+    # Returns the index rows (key, source, user_id) of the hashes already kept
+    index.execute("DELETE FROM batch_keys")
+    index.executemany("INSERT OR IGNORE INTO batch_keys VALUES (?)", ((int(h),) for h in hashes))
+    return pd.DataFrame(
+        index.execute("SELECT d.key, d.source, d.user_id FROM dedup_keys d JOIN batch_keys b ON d.key = b.key"),
+        columns=["key", "source", "user_id"],
+    )
+
+
+def add_keys(index, df, run_id):
+    hashes, has_key = dedup_key_hashes(df)
+    user_ids = df["user_id"].astype("Int64").astype(object).where(df["user_id"].notna(), None)
+    index.executemany(
+        "INSERT OR REPLACE INTO dedup_keys VALUES (?, ?, ?, ?)",
+        ((int(h), src, uid, run_id)
+         for kind in DEDUP_KEYS
+         for h, src, uid in zip(hashes.loc[has_key[kind], kind], df.loc[has_key[kind], "source"],
+                                user_ids[has_key[kind]])),
+    )
+    index.commit()
+
+
+def remove_keys(index, df):
+    hashes, has_key = dedup_key_hashes(df)
+    index.executemany(
+        "DELETE FROM dedup_keys WHERE key = ?",
+        ((int(h),) for kind in DEDUP_KEYS for h in hashes.loc[has_key[kind], kind]),
+    )
+    index.commit()
+
+
+def _hash64(key):
+    return pd.util.hash_pandas_object(key, index=False).to_numpy().view("int64")
+
+
+def dedup_key_hashes(df):
+    # Two keys per row: the email, and the user_id inside its source (ids
+    # from different sources belong to different users). The prefixes keep
+    # both kinds apart in the index.
+    email = df["email"].astype("string").str.strip().str.lower()
+    user_id = df["source"].astype("string") + ":" + df["user_id"].astype("Int64").astype("string")
+    hashes = pd.DataFrame({"email": _hash64("email:" + email), "user_id": _hash64("id:" + user_id)},
+                          index=df.index)
+    return hashes, pd.DataFrame({"email": email.notna(), "user_id": user_id.notna()})
+
+
+def find_duplicates(df, index=None, run_id=None):
+    hashes, has_key = dedup_key_hashes(df)
+    duplicated = pd.Series(False, index=df.index)
+    kept_source = pd.Series(None, index=df.index, dtype=object)
+
+    # 1. Duplicates inside this batch: the first row of each key wins
+    for kind in DEDUP_KEYS:
+        keys = hashes.loc[has_key[kind], kind]
+        first = ~keys.duplicated()
+        winners = pd.Series(df.loc[keys.index[first], "source"].to_numpy(), index=keys[first].to_numpy())
+        dup = keys[~first]
+        duplicated[dup.index] = True
+        kept_source[dup.index] = kept_source[dup.index].fillna(dup.map(winners))
+
+    # 2. Duplicates of keys kept by earlier batches or runs
+    if index is not None:
+        candidates = has_key.where(~duplicated, False)
+        existing = lookup_keys(index, np.concatenate([hashes.loc[candidates[kind], kind] for kind in DEDUP_KEYS]))
+        if not existing.empty:
+            winners = existing.set_index("key")["source"]
+            for kind in DEDUP_KEYS:
+                seen = candidates[kind] & hashes[kind].isin(winners.index)
+                duplicated |= seen
+                kept_source[seen] = kept_source[seen].fillna(hashes.loc[seen, kind].map(winners))
+        add_keys(index, df[~duplicated], run_id)
+        count_dedup_rows(index, run_id, (~duplicated).sum(), duplicated.sum())
+
+    return duplicated, kept_source
+
+
+def reset_dedup_report(path=None):
+    path = path or DEDUP_REPORT_PATH
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def write_dedup_report(df_dropped, kept_source, path=None):
+    path = path or DEDUP_REPORT_PATH
+    if df_dropped.empty:
+        return
+
+    report = pd.DataFrame({
+        "email": df_dropped["email"],
+        "user_id": df_dropped["user_id"],
+        "dropped_source": df_dropped["source"],
+        "kept_source": kept_source,
+    })
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    report.to_csv(path, mode="a", header=not os.path.exists(path), index=False)
+
+
+def survivorship_rank(source):
+    return SURVIVORSHIP.index(source) if source in SURVIVORSHIP else len(SURVIVORSHIP)
+
+
+@instrument("combine_sources")
+def combine_sources(list_of_dfs, index=None, run_id=None):
+    df = pd.concat(list_of_dfs, ignore_index=True)
+
+    # Stable sort: the winning source comes first, original order otherwise
+    rank = df["source"].map(survivorship_rank)
+    df = df.iloc[rank.argsort(kind="stable")].reset_index(drop=True)
+
+    duplicated, kept_source = find_duplicates(df, index, run_id)
+    write_dedup_report(df[duplicated], kept_source[duplicated])
+    if duplicated.any():
+        log(f"Dropped {int(duplicated.sum())} duplicate rows")
+
+    return df[~duplicated].reset_index(drop=True)
+
+
+def _clean_text(series):
+    return series.astype("string").str.strip()
+
+
+def cast_final_dtypes(df):
+    for col, dtype in FINAL_DTYPES.items():
+        if col not in df.columns:
+            continue
+        if dtype == "category":
+            # Categories = the values present, so they do not depend on
+            # which frames were concatenated to build df
+            df[col] = df[col].astype("category").cat.remove_unused_categories()
+        elif str(df[col].dtype) != dtype:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+@instrument("enrich")
+def enrich(df):
+    df = df.copy()
+
+    # The lazy pipeline may have projected some columns away
+    for col in ["first_name", "last_name"]:
+        if col in df.columns:
+            df[col] = _clean_text(df[col])
+    df["email"] = _clean_text(df["email"]).str.lower()
+
+    if "country" in df.columns:
+        country = _clean_text(df["country"])
+        df["country"] = country.str.lower().replace(COUNTRY_ALIASES).str.title()
+
+    if "age" in df.columns:
+        # Whole years, always Int64 (to_numeric alone gives Float64 when
+        # every age of the batch is null)
+        age = pd.to_numeric(_clean_text(df["age"]), errors="coerce").astype("Float64")
+        df["age"] = np.floor(age).astype("Int64")
+        df["is_adult"] = df["age"] >= 18
+
+    if "first_name" in df.columns and "last_name" in df.columns:
+        df["full_name"] = df["first_name"] + " " + df["last_name"]
+
+    if "signup_date" in df.columns:
+        df["signup_date"] = pd.to_datetime(df["signup_date"], errors="coerce")
+    if "last_login" in df.columns:
+        df["last_login"] = pd.to_datetime(df["last_login"], errors="coerce", utc=True)
+
+    # Rows without email are kept for validation, which drops them
+    return df.reset_index(drop=True)
+
+
+def write_ipc_stream(table, sink):
+    # Kept in its own function so no reference to the sink outlives the write
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def frame_to_shared_memory(df):
+    # Columns that Arrow cannot represent (mixed objects) are pickled instead
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return df
+
+    sink = pa.MockOutputStream()
+    write_ipc_stream(table, sink)
+    size = sink.size()
+
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    write_ipc_stream(table, pa.FixedSizeBufferWriter(pa.py_buffer(block.buf)))
+    # The parent unlinks the block once it has read it. SharedMemory also
+    # registers every block it creates with the resource tracker, which
+    # unlinks the blocks still registered when the program ends (or when a
+    # worker's own tracker exits, possibly before the parent has read it)
+    # and warns about them as leaks. Python 3.13 has track=False for this;
+    # before that the block must be unregistered by hand, under the private
+    # _name ("/"-prefixed) it was registered with, not block.name.
+    resource_tracker.unregister(block._name, "shared_memory")
+    block.close()
+    return block.name, size
+
+
+def frame_from_shared_memory(result):
+    if isinstance(result, pd.DataFrame):
+        return result
+
+    name, size = result
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        view = block.buf[:size]
+        data = pa.py_buffer(bytes(view))
+        view.release()
+    finally:
+        block.close()
+        block.unlink()
+
+    with pa.ipc.open_stream(data) as reader:
+        return reader.read_all().to_pandas()
+
+
+def _enrich_partition(rows):
+    # enrich.__wrapped__: metrics are only written by the parent process
+    return frame_to_shared_memory(enrich.__wrapped__(_shared_df.iloc[rows]))
+
+
+@instrument("enrich_partitioned")
+def enrich_partitioned(df, partitions=None, by=None):
+    partitions = partitions or TRANSFORM_PARTITIONS
+    by = by or TRANSFORM_PARTITION_BY
+    if partitions <= 1 or len(df) < partitions or pa is None \
+            or "fork" not in multiprocessing.get_all_start_methods():
+        return enrich(df)
+
+    # The dtypes enrich() gives the whole frame; each part went through Arrow
+    # on its own and can come back with others (e.g. an all-null column)
+    dtypes = enrich.__wrapped__(df.head(0)).dtypes
+
+    if by == "user_id":
+        part = pd.util.hash_pandas_object(df["user_id"], index=False).to_numpy() % partitions
+        tasks = [np.flatnonzero(part == i) for i in range(partitions)]
+        df = df.assign(_row=np.arange(len(df)))
+    else:
+        bounds = np.linspace(0, len(df), partitions + 1).astype(int)
+        tasks = [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    with ProcessPoolExecutor(max_workers=partitions, mp_context=multiprocessing.get_context("fork"),
+                             initializer=_init_shared_df, initargs=(df,)) as executor:
+        parts = [frame_from_shared_memory(result) for result in executor.map(_enrich_partition, tasks)]
+
+    df_final = pd.concat(parts, ignore_index=True)
+    if by == "user_id":
+        df_final = df_final.sort_values("_row", kind="stable").drop(columns="_row").reset_index(drop=True)
+
+    for col, dtype in dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            # Categories are rebuilt from all parts, not taken from the empty frame
+            if not isinstance(df_final[col].dtype, pd.CategoricalDtype):
+                df_final[col] = df_final[col].astype("category")
+        elif df_final[col].dtype != dtype:
+            df_final[col] = df_final[col].astype(dtype)
+    return df_final
+
+
+def transform_all(data_dict):
+    if not isinstance(data_dict["csv"], pd.DataFrame):
+        return transform_chunks(data_dict)
+
+    reset_dedup_report()
+    reset_quarantine()
+
+    data_sources = {name: normalize_columns(df) for name, df in data_dict.items()}
+    list_of_dfs = standardize_structures(data_sources)
+    df_combined = combine_sources(list_of_dfs)
+    df_final = enrich_partitioned(df_combined).reindex(columns=FINAL_COLUMNS + [INVALID_COLUMN])
+    # Cast after validation: categories of quarantined rows are not kept
+    df_final = cast_final_dtypes(apply_validation(df_final))
+
+    log(f"Transform finished: {df_final.shape}")
+    return df_final
+
+
+def previous_output_path():
+    return os.path.join(OUTPUT_DIR, "final_users.csv")
+
+
+def read_previous_output():
+    path = previous_output_path()
+    if not os.path.exists(path):
+        return None
+
+    # Same dtypes as a full run, not what read_csv would infer
+    df = pd.read_csv(path, dtype={col: "string" for col in ["first_name", "last_name", "email", "country"]})
+    df["signup_date"] = pd.to_datetime(df["signup_date"], errors="coerce")
+    df["last_login"] = pd.to_datetime(df["last_login"], errors="coerce", utc=True)
+    return cast_final_dtypes(df)
+
+
+def apply_extra_updates(df, df_extra):
+    df_extra = df_extra[[col for col in EXTRA_COLUMNS if col in df_extra.columns]]
+    df_extra = df_extra.drop_duplicates(subset="user_id", keep="last").set_index("user_id")
+    if "last_login" in df_extra.columns:
+        df_extra["last_login"] = pd.to_datetime(df_extra["last_login"], errors="coerce", utc=True)
+
+    is_csv = df["source"] == "csv"
+    for col in df_extra.columns:
+        updates = df.loc[is_csv, "user_id"].map(df_extra[col])
+        df.loc[is_csv, col] = updates.combine_first(df.loc[is_csv, col])
+
+    return df
+
+
+def replace_previous_rows(index, df_previous, df_delta, run_id):
+    # The index finds the previous rows that share a key with a new row, so
+    # the previous output is not hashed again
+    hashes, has_key = dedup_key_hashes(df_delta)
+    new_keys = pd.concat([
+        pd.DataFrame({"key": hashes.loc[has_key[kind], kind].to_numpy(),
+                      "row": hashes.index[has_key[kind]],
+                      "new_source": df_delta.loc[has_key[kind], "source"].to_numpy()})
+        for kind in DEDUP_KEYS
+    ])
+    matches = lookup_keys(index, new_keys["key"].to_numpy()).merge(new_keys, on="key")
+
+    # Survivorship: a new row loses to previous rows from a higher-ranked source
+    # and replaces the others
+    new_wins = matches["new_source"].map(survivorship_rank) <= matches["source"].map(survivorship_rank)
+    lost = matches[~new_wins].drop_duplicates("row")
+    replaced = matches[new_wins & ~matches["row"].isin(lost["row"])]
+
+    # Previous rows are found by (source, user_id); rows without user_id
+    # are only in the index under their email
+    by_id = replaced[replaced["user_id"].notna()].drop_duplicates(["source", "user_id"])
+    by_id = pd.Series(by_id["new_source"].to_numpy(),
+                      index=pd.MultiIndex.from_arrays([by_id["source"], by_id["user_id"].astype("Int64")]))
+    kept_source = pd.Series(
+        by_id.reindex(pd.MultiIndex.from_arrays([df_previous["source"], df_previous["user_id"]])).to_numpy(),
+        index=df_previous.index,
+    )
+    no_id = df_previous["user_id"].isna()
+    by_email = replaced[replaced["user_id"].isna()].drop_duplicates("key").set_index("key")["new_source"]
+    if no_id.any() and not by_email.empty:
+        kept_source[no_id] = dedup_key_hashes(df_previous[no_id])[0]["email"].map(by_email)
+
+    is_replaced = kept_source.notna()
+    df_lost = df_delta.loc[lost["row"]]
+    write_dedup_report(df_previous[is_replaced], kept_source[is_replaced])
+    write_dedup_report(df_lost, pd.Series(lost["source"].to_numpy(), index=df_lost.index))
+
+    remove_keys(index, df_previous[is_replaced])
+    df_delta = df_delta.drop(index=lost["row"])
+    add_keys(index, df_delta, run_id)
+    count_dedup_rows(index, run_id, len(df_delta), is_replaced.sum() + len(df_lost))
+
+    df = pd.concat([df_delta, df_previous[~is_replaced]], ignore_index=True)
+    rank = df["source"].map(survivorship_rank)
+    return df.iloc[rank.argsort(kind="stable")].reset_index(drop=True)
+
+
+def transform_incremental(data_dict, state):
+    df_previous = read_previous_output()
+    index = open_dedup_index()
+
+    try:
+        # First run: nothing to merge into, so it is a full run
+        if df_previous is None:
+            run_id = start_dedup_run(index, "full")
+            _, new_state = select_new_rows(data_dict, {})
+            df_final = transform_all(data_dict)
+            add_keys(index, df_final, run_id)
+            count_dedup_rows(index, run_id, len(df_final), 0)
+        else:
+            # The state is saved after the output, so it names the last run
+            # whose keys match that output; otherwise the keys are rebuilt
+            in_sync = state.get("dedup_run") is not None and state["dedup_run"] == last_dedup_run(index)
+            run_id = start_dedup_run(index, "incremental" if in_sync else "rebuild")
+            if not in_sync:
+                add_keys(index, df_previous, run_id)
+
+            delta, new_state = select_new_rows(data_dict, state)
+            delta.pop("api", None)
+            log(f"Incremental delta: csv={len(delta['csv'])} json={len(delta['json'])}")
+
+            df_final = df_previous
+            if not delta["csv"].empty:
+                # New users still look up their extras in the whole JSON source
+                df_delta = transform_all({"csv": delta["csv"], "json": data_dict["json"]})
+                # The delta can be empty (e.g. only rows without email were re-read)
+                if not df_delta.empty:
+                    df_final = replace_previous_rows(index, df_previous, df_delta, run_id)
+
+            if not delta["json"].empty:
+                df_final = apply_extra_updates(df_final, normalize_columns(delta["json"]))
+
+        finish_dedup_run(index, run_id)
+    finally:
+        index.close()
+
+    new_state["dedup_run"] = run_id
+    return cast_final_dtypes(df_final), new_state
+
+
+def iter_source_batches(data_dict):
+    lookups = {name: normalize_columns(df) for name, df in data_dict.items() if name != "csv"}
+
+    # The JSON source only adds columns to the CSV rows, it has no rows of its own
+    for name in sorted(data_dict, key=survivorship_rank):
+        if name == "csv":
+            for chunk in data_dict["csv"]:
+                yield {"csv": normalize_columns(chunk), "json": lookups.get("json")}
+        elif name != "json":
+            yield {name: lookups[name]}
+
+
+def transform_chunks(data_dict):
+    reset_dedup_report()
+    reset_quarantine()
+    index = open_dedup_index()
+    run_id = start_dedup_run(index, "full")
+    rows = 0
+    chunks = 0
+
+    try:
+        for data_sources in iter_source_batches(data_dict):
+            data_sources = {name: df for name, df in data_sources.items() if df is not None}
+            list_of_dfs = standardize_structures(data_sources)
+            # Batches from different sources must share one column layout
+            df_chunk = combine_sources(list_of_dfs, index, run_id)
+            df_chunk = enrich(df_chunk).reindex(columns=FINAL_COLUMNS + [INVALID_COLUMN])
+            df_chunk = cast_final_dtypes(apply_validation(df_chunk))
+
+            rows += len(df_chunk)
+            chunks += 1
+            yield df_chunk
+        finish_dedup_run(index, run_id)
+    finally:
+        index.close()
+
+    log(f"Transform finished: {rows} rows in {chunks} chunks")
+
+
+FILTER_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "in": lambda s, values: s.isin(values),
+    "not in": lambda s, values: ~s.isin(values),
+}
+
+# Source column -> final column, for the projection pushdown
+SOURCE_COLUMNS = {
+    "csv": {col: col for col in CSV_COLUMNS},
+    "json": {col: col for col in EXTRA_COLUMNS},
+    "api": API_COLUMN_MAP,
+}
+
+
+def lazy_transform(columns=None, filters=None, sources=None):
+    sources = [name for name in (sources or EXTRACT_SOURCES) if name in SOURCE_COLUMNS]
+    filters = list(filters or [])
+    for _, op, _ in filters:
+        if op not in FILTER_OPERATORS:
+            raise ValueError(f"Unknown filter operator: {op}")
+
+    row_sources = [name for name in sources if name != "json"]
+    nodes = {f"scan_{name}": {"op": "scan", "inputs": [], "source": name, "columns": None} for name in sources}
+    nodes["standardize"] = {"op": "standardize", "inputs": [f"scan_{name}" for name in row_sources],
+                            "sources": row_sources, "filters": []}
+    nodes["combine"] = {"op": "combine", "inputs": ["standardize"]}
+    last = "combine"
+    if "json" in sources:
+        nodes["join_extra"] = {"op": "join_extra", "inputs": ["combine", "scan_json"]}
+        last = "join_extra"
+    nodes["enrich"] = {"op": "enrich", "inputs": [last]}
+    nodes["filter"] = {"op": "filter", "inputs": ["enrich"], "filters": filters}
+    nodes["select"] = {"op": "select", "inputs": ["filter"], "columns": list(columns or FINAL_COLUMNS)}
+    nodes["validate"] = {"op": "validate", "inputs": ["select"]}
+
+    return {"nodes": nodes, "output": "validate", "optimized": False}
+
+
+def is_lazy_plan(obj):
+    return isinstance(obj, dict) and "nodes" in obj and "output" in obj
+
+
+def optimize_plan(plan):
+    nodes = {name: dict(node) for name, node in plan["nodes"].items()}
+    filters = nodes["filter"]["filters"]
+
+    # 1. Predicate pushdown
+    nodes["standardize"]["filters"] = [f for f in filters if f[0] in PUSHDOWN_COLUMNS]
+    nodes["filter"]["filters"] = [f for f in filters if f[0] not in PUSHDOWN_COLUMNS]
+
+    # 2. Projection pushdown: output, filters, dedup key and validated columns
+    needed = set(nodes["select"]["columns"]) | {col for col, _, _ in filters} | {"user_id", "email"}
+    if VALIDATION_MODE == "full":
+        needed |= set(VALIDATION_RULES)
+    for col, inputs in DERIVED_COLUMNS.items():
+        if col in needed:
+            needed |= set(inputs)
+
+    for node in nodes.values():
+        if node["op"] == "scan":
+            node["columns"] = [raw for raw, col in SOURCE_COLUMNS[node["source"]].items() if col in needed]
+
+    # 3. No extra column needed: skip the JSON source and its join
+    if "join_extra" in nodes and nodes["scan_json"]["columns"] == ["user_id"]:
+        nodes["enrich"]["inputs"] = ["combine"]
+        del nodes["join_extra"], nodes["scan_json"]
+
+    return {**plan, "nodes": nodes, "optimized": True}
+
+
+def filter_mask(df, filters):
+    mask = pd.Series(True, index=df.index)
+    for col, op, value in filters:
+        if col not in df.columns:
+            return pd.Series(False, index=df.index)
+        result = FILTER_OPERATORS[op](df[col], value)
+        mask &= pd.Series(result, index=df.index).fillna(False).astype(bool)
+    return mask
+
+
+def run_standardize(node, *frames):
+    dfs = standardize_structures(dict(zip(node["sources"], frames)))
+    if not node["filters"]:
+        return dfs
+    # Rows are only flagged here: they still count for the deduplication
+    return [df.assign(_keep=filter_mask(df, node["filters"])) for df in dfs]
+
+
+def run_combine(node, dfs):
+    df = combine_sources(dfs)
+    if "_keep" in df.columns:
+        df = df[df["_keep"].astype(bool)].drop(columns="_keep").reset_index(drop=True)
+    return df
+
+
+def run_join_extra(node, df, df_extra):
+    # Same result as the join in standardize_structures(): the first extra
+    # row of a user wins, API rows get no extras
+    df_extra = df_extra.drop_duplicates(subset="user_id")
+    is_csv = df["source"] == "csv"
+    joined = join_frames(df.loc[is_csv, ["user_id"]], df_extra, on="user_id", how="left")
+    for col in df_extra.columns.drop("user_id"):
+        df[col] = pd.Series(joined[col].array, index=df.index[is_csv])
+    return df
+
+
+def run_filter(node, df):
+    if not node["filters"]:
+        return df
+    return df[filter_mask(df, node["filters"])].reset_index(drop=True)
+
+
+LAZY_OPERATIONS = {
+    "standardize": run_standardize,
+    "combine": run_combine,
+    "join_extra": run_join_extra,
+    "enrich": lambda node, df: enrich_partitioned(df),
+    "filter": run_filter,
+    "select": lambda node, df: df.reindex(columns=node["columns"] + [INVALID_COLUMN]),
+    "validate": lambda node, df: apply_validation(df),
+}
+
+
+def scan_sources(scans):
+    sources = {}
+    for node in scans.values():
+        func, arg = EXTRACT_SOURCES[node["source"]]
+        # The file readers take usecols; the API is projected after the request
+        if func in (extract_csv, extract_json):
+            func = partial(func, columns=node["columns"])
+        sources[node["source"]] = (func, arg)
+
+    data = extract_all(sources=sources)
+    results = {}
+    for name, node in scans.items():
+        df = normalize_columns(data[node["source"]])
+        results[name] = df[[col for col in node["columns"] + [INVALID_COLUMN] if col in df.columns]]
+    return results
+
+
+@instrument("collect")
+def collect(plan):
+    if not plan["optimized"]:
+        plan = optimize_plan(plan)
+    nodes = plan["nodes"]
+
+    reset_dedup_report()
+    reset_quarantine()
+
+    # Nodes are declared in dependency order; the scans run concurrently
+    results = scan_sources({name: node for name, node in nodes.items() if node["op"] == "scan"})
+    for name, node in nodes.items():
+        if node["op"] != "scan":
+            results[name] = LAZY_OPERATIONS[node["op"]](node, *[results.pop(i) for i in node["inputs"]])
+
+    df_final = cast_final_dtypes(results[plan["output"]])
+    log(f"Transform finished: {df_final.shape}")
+    return df_final
 
 
 # 5. LOAD
@@ -163,7 +2102,288 @@
 #       - Optional: export to Excel
 #       - Optional: include timestamp in filenames
 #
-# YOUR CODE HERE
+# 5.5 Streaming mode
+#       - load_all() also accepts an iterator of DataFrames
+#       - Every chunk is appended to the open CSV/JSON files, so only one
+#         chunk is in memory at a time (Excel and columnar outputs are
+#         skipped in this mode)
+#
+# 5.6 Columnar outputs
+#       - load_all(columnar=True) also writes final_users.parquet and
+#         final_users.feather (Arrow IPC), both compressed
+#       - Low-cardinality text columns are stored as dictionaries
+#       - partition_by="country" (or "signup_year") writes the Parquet
+#         output as one folder per value instead of one file
+#
+# 5.7 Parallel writer
+#       - write_formats() writes every format at the same time from the
+#         same DataFrame, which no writer modifies
+#       - JSON and Excel (PROCESS_FORMATS) run in a process pool; the
+#         DataFrame is handed to each worker once, through fork when the
+#         platform has it, instead of with every task
+#       - CSV, Parquet and Feather run in threads (their encoders are
+#         native code)
+#       - Every output is written to a temporary name and then renamed,
+#         so readers never see a half-written file
+#       - load_all() returns the seconds spent on each format
+#
+# 5.8 Streaming Excel
+#       - load_all(excel=True, excel_mode="streaming") (or
+#         ETL_EXCEL_MODE=streaming) writes the workbook with openpyxl's
+#         write-only mode: rows are converted chunk by chunk and streamed
+#         to disk instead of building the whole workbook in memory
+#       - A sheet holds at most EXCEL_MAX_ROWS rows, so larger outputs go
+#         on to Sheet1_2, Sheet1_3...
+#
+
+def ensure_output_dir():
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+
+def save_csv(df, path):
+    df.to_csv(path, index=False)
+
+
+def save_json(df, path):
+    df.to_json(path, orient="records", indent=2, date_format="iso")
+
+
+def excel_rows(df, chunksize=EXCEL_CHUNK_ROWS):
+    for start in range(0, len(df), chunksize):
+        chunk = df.iloc[start:start + chunksize].copy()
+        for col in chunk.select_dtypes(include=["datetimetz"]).columns:
+            chunk[col] = chunk[col].dt.tz_localize(None)
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        yield from chunk.itertuples(index=False, name=None)
+
+
+def write_excel_streaming(df, path, sheet_name="Sheet1", max_rows=EXCEL_MAX_ROWS):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    header = [str(col) for col in df.columns]
+    rows_per_sheet = max_rows - 1
+
+    sheets = 0
+    written = rows_per_sheet
+    for row in excel_rows(df):
+        if written == rows_per_sheet:
+            sheets += 1
+            sheet = workbook.create_sheet(sheet_name if sheets == 1 else f"{sheet_name}_{sheets}")
+            sheet.append(header)
+            written = 0
+        sheet.append(row)
+        written += 1
+
+    if sheets == 0:             # empty DataFrame: header only
+        sheets = 1
+        workbook.create_sheet(sheet_name).append(header)
+
+    workbook.save(path)
+    return sheets
+
+
+def save_excel(df, path, excel_mode=None):
+    excel_mode = excel_mode or EXCEL_MODE
+    if excel_mode == "streaming":
+        write_excel_streaming(df, path)
+        return
+    if excel_mode != "pandas":
+        raise ValueError(f"Unknown Excel mode: {excel_mode}")
+
+    df_excel = df.copy()
+    # Excel does not support timezone-aware datetimes
+    for col in df_excel.select_dtypes(include=["datetimetz"]).columns:
+        df_excel[col] = df_excel[col].dt.tz_localize(None)
+    df_excel.to_excel(path, index=False)
+
+
+def to_dictionary_columns(df, max_ratio=None):
+    max_ratio = DICTIONARY_MAX_RATIO if max_ratio is None else max_ratio
+
+    df = df.copy()
+    for col in df.select_dtypes(include=["object", "string"]).columns:
+        if len(df) and df[col].nunique() / len(df) <= max_ratio:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def save_parquet(df, path, partition_by=None):
+    # The previous output may be a single file or a partitioned folder
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+    if partition_by is None:
+        df.to_parquet(path, engine="pyarrow", index=False,
+                      compression=PARQUET_COMPRESSION, use_dictionary=True)
+        return
+
+    if partition_by == "signup_year" and "signup_year" not in df.columns:
+        # Int64 keeps the folder names as years (2021, not 2021.0) when some
+        # rows have no signup date
+        df = df.assign(signup_year=pd.to_datetime(df["signup_date"]).dt.year.astype("Int64"))
+
+    df.to_parquet(path, engine="pyarrow", index=False, partition_cols=[partition_by],
+                  compression=PARQUET_COMPRESSION, use_dictionary=True)
+
+
+def save_feather(df, path):
+    df.reset_index(drop=True).to_feather(path, compression=FEATHER_COMPRESSION)
+
+
+def save_dictionary_parquet(df, path, partition_by=None):
+    save_parquet(to_dictionary_columns(df), path, partition_by)
+
+
+def save_dictionary_feather(df, path):
+    save_feather(to_dictionary_columns(df), path)
+
+
+WRITERS = {
+    "csv": save_csv,
+    "json": save_json,
+    "xlsx": save_excel,
+    "parquet": save_dictionary_parquet,
+    "feather": save_dictionary_feather,
+}
+
+
+def replace_output(tmp_path, path):
+    # A partitioned Parquet output is a folder, which os.replace cannot overwrite
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.isdir(tmp_path) and os.path.exists(path):
+        os.remove(path)
+    os.replace(tmp_path, path)
+
+
+def remove_output(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def write_format(df, fmt, path, partition_by=None, excel_mode=None):
+    start = time.perf_counter()
+
+    # Keep the extension: pandas picks the Excel engine from it
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.tmp{os.getpid()}{ext}"
+
+    try:
+        if fmt == "parquet":
+            WRITERS[fmt](df, tmp_path, partition_by)
+        elif fmt == "xlsx":
+            WRITERS[fmt](df, tmp_path, excel_mode)
+        else:
+            WRITERS[fmt](df, tmp_path)
+        replace_output(tmp_path, path)
+    finally:
+        # Only left behind when the writer failed half-way
+        remove_output(tmp_path)
+
+    return time.perf_counter() - start
+
+
+_shared_df = None
+
+
+def _init_shared_df(df):
+    global _shared_df
+    _shared_df = df
+
+
+def _write_shared_format(fmt, path, partition_by=None, excel_mode=None):
+    return write_format(_shared_df, fmt, path, partition_by, excel_mode)
+
+
+def write_formats(df, basename, formats, partition_by=None, parallel=True, excel_mode=None):
+    paths = {fmt: f"{basename}.{fmt}" for fmt in formats}
+
+    if not parallel:
+        return {fmt: write_format(df, fmt, paths[fmt], partition_by, excel_mode) for fmt in formats}
+
+    process_formats = [fmt for fmt in formats if fmt in PROCESS_FORMATS]
+    thread_formats = [fmt for fmt in formats if fmt not in PROCESS_FORMATS]
+
+    futures = {}
+    processes = None
+    threads = ThreadPoolExecutor(max_workers=max(len(thread_formats), 1))
+
+    try:
+        if process_formats:
+            # With fork the workers inherit the DataFrame without pickling it
+            context = None
+            if "fork" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("fork")
+            processes = ProcessPoolExecutor(
+                max_workers=len(process_formats),
+                mp_context=context,
+                initializer=_init_shared_df,
+                initargs=(df,),
+            )
+            for fmt in process_formats:
+                futures[fmt] = processes.submit(_write_shared_format, fmt, paths[fmt], partition_by, excel_mode)
+
+        for fmt in thread_formats:
+            futures[fmt] = threads.submit(write_format, df, fmt, paths[fmt], partition_by, excel_mode)
+
+        timings = {fmt: futures[fmt].result() for fmt in formats}
+    finally:
+        threads.shutdown()
+        if processes is not None:
+            processes.shutdown()
+
+    return timings
+
+
+def append_json_records(df, f, first):
+    # Reuse pandas' records layout and splice the chunk into one JSON array
+    records = df.to_json(orient="records", indent=2, date_format="iso").strip()[1:-1].strip("\n")
+    if records:
+        f.write(("\n" if first else ",\n") + records)
+        return True
+    return False
+
+
+@instrument("load_all")
+def load_all(df_final, excel=False, columnar=False, partition_by=None, parallel=True, excel_mode=None):
+    ensure_output_dir()
+    if is_lazy_plan(df_final):
+        df_final = collect(df_final)
+
+    csv_path = os.path.join(OUTPUT_DIR, "final_users.csv")
+    json_path = os.path.join(OUTPUT_DIR, "final_users.json")
+
+    if isinstance(df_final, pd.DataFrame):
+        formats = ["csv", "json"]
+        if excel:
+            formats.append("xlsx")
+        if columnar:
+            formats += ["parquet", "feather"]
+
+        timings = write_formats(df_final, os.path.join(OUTPUT_DIR, "final_users"),
+                                formats, partition_by, parallel, excel_mode)
+
+        log(f"Saved {len(df_final)} rows to {OUTPUT_DIR}")
+        for fmt, seconds in timings.items():
+            log(f"Load timing {fmt}: {seconds:.3f}s")
+        return timings
+
+    rows = 0
+    with open(csv_path, "w", encoding="utf-8", newline="") as f_csv, \
+            open(json_path, "w", encoding="utf-8") as f_json:
+        f_json.write("[")
+        for i, chunk in enumerate(df_final):
+            chunk.to_csv(f_csv, index=False, header=(i == 0))
+            if append_json_records(chunk, f_json, first=(rows == 0)):
+                rows += len(chunk)
+        f_json.write("\n]" if rows else "]")
+
+    log(f"Saved {rows} rows to {OUTPUT_DIR} (streaming)")
 
 
 # 6. main() FUNCTION — OVERALL ORCHESTRATION
@@ -183,7 +2403,213 @@
 # if __name__ == "__main__":
 #       main()
 #
-# YOUR CODE HERE
+# Streaming mode:
+#   main(chunksize=N) runs the same phases chunk by chunk.
+#
+# Incremental mode:
+#   main(incremental=True) processes only rows at or after the stored
+#   watermarks. The watermarks are saved only after load_all() succeeds.
+#
+# Lazy mode:
+#   main(lazy=True) declares the transform with lazy_transform(OUTPUT_COLUMNS,
+#   OUTPUT_FILTERS); extract and transform only run inside load_all().
+#
+# Checkpoints:
+#   Eager runs (no chunksize, not incremental, not lazy) store the output of
+#   every stage in CHECKPOINT_DIR (ETL_CHECKPOINTS=0 turns this off):
+#     - extract: one checkpoint per source, keyed by the file's path, size
+#       and mtime (the API by its URL, for CHECKPOINT_API_MAX_AGE seconds)
+#     - transform: keyed by the extract keys and TRANSFORM_CONFIG
+#     - load: keyed by the transform key and OUTPUT_DIR; skipped while the
+#       output files still have the size and content (sha256) they had
+#       when this stage wrote them
+#   Every key also includes a hash of this file, so a code change reruns
+#   everything. A rerun after a failure resumes from the first stage
+#   without a valid checkpoint.
+#
+# Profiling:
+#   main(profile=True) (or ETL_PROFILE=1) runs the pipeline under cProfile
+#   and tracemalloc. Stage metrics are always written to METRICS_PATH.
+#
+
+_code_fingerprint = None
+
+
+def code_fingerprint():
+    global _code_fingerprint
+    if _code_fingerprint is None:
+        with open(__file__, "rb") as f:
+            _code_fingerprint = hashlib.sha256(f.read()).hexdigest()
+    return _code_fingerprint
+
+
+def fingerprint(*parts):
+    payload = json.dumps(parts, default=str, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:20]
+
+
+def source_fingerprint(name):
+    func, arg = EXTRACT_SOURCES[name]
+    parts = [name, getattr(func, "__name__", repr(func)), arg, code_fingerprint()]
+    if isinstance(arg, str) and os.path.exists(arg):
+        stat = os.stat(arg)
+        parts += [stat.st_size, stat.st_mtime_ns, SCHEMAS]
+    return fingerprint(*parts)
+
+
+def checkpoint_path(stage, key):
+    return os.path.join(CHECKPOINT_DIR, f"{stage}-{key}.pkl")
+
+
+def load_checkpoint(stage, key, max_age=None):
+    path = checkpoint_path(stage, key)
+    if not os.path.exists(path):
+        return None
+    if max_age is not None and time.time() - os.path.getmtime(path) > max_age:
+        return None
+    log(f"Checkpoint hit: {stage}")
+    return pd.read_pickle(path)
+
+
+def save_checkpoint(stage, key, obj):
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    path = checkpoint_path(stage, key)
+    tmp_path = f"{path}.tmp"
+    pd.to_pickle(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+    # Only the newest checkpoint of every stage is kept
+    for filename in os.listdir(CHECKPOINT_DIR):
+        if filename.startswith(f"{stage}-") and filename.endswith(".pkl") and filename != os.path.basename(path):
+            os.remove(os.path.join(CHECKPOINT_DIR, filename))
+
+
+def extract_checkpointed():
+    keys = {name: source_fingerprint(name) for name in EXTRACT_SOURCES}
+
+    data = {}
+    for name, key in keys.items():
+        func, arg = EXTRACT_SOURCES[name]
+        is_file = isinstance(arg, str) and os.path.exists(arg)
+        cached = load_checkpoint(f"extract_{name}", key, None if is_file else CHECKPOINT_API_MAX_AGE)
+        if cached is not None:
+            data[name] = cached
+
+    missing = {name: EXTRACT_SOURCES[name] for name in keys if name not in data}
+    if missing:
+        for name, df in extract_all(sources=missing).items():
+            save_checkpoint(f"extract_{name}", keys[name], df)
+            data[name] = df
+
+    return {name: data[name] for name in EXTRACT_SOURCES}, keys
+
+
+def transform_checkpointed(data, extract_keys):
+    config = {name: globals()[name] for name in TRANSFORM_CONFIG}
+    key = fingerprint(extract_keys, config, code_fingerprint())
+
+    df_final = load_checkpoint("transform", key)
+    if df_final is None:
+        df_final = transform_all(data)
+        save_checkpoint("transform", key, df_final)
+    return df_final, key
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def output_stamp(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": file_sha256(path)}
+
+
+def output_unchanged(path, stamp):
+    if not os.path.exists(path):
+        return False
+    stat = os.stat(path)
+    if stat.st_size != stamp["size"]:
+        return False
+    # Same size and mtime: unchanged; touched files are compared by content
+    return stat.st_mtime_ns == stamp["mtime_ns"] or file_sha256(path) == stamp["sha256"]
+
+
+def load_checkpointed(df_final, transform_key):
+    key = fingerprint(transform_key, OUTPUT_DIR, code_fingerprint())
+
+    stamps = load_checkpoint("load", key)
+    if stamps is not None and all(output_unchanged(path, stamp) for path, stamp in stamps.items()):
+        log("Load skipped: outputs are up to date")
+        return
+
+    load_all(df_final)
+    paths = [os.path.join(OUTPUT_DIR, name) for name in ["final_users.csv", "final_users.json"]]
+    save_checkpoint("load", key, {path: output_stamp(path) for path in paths})
+
+
+def main(chunksize=None, incremental=False, profile=None, lazy=False, checkpoint=None):
+    if chunksize and incremental:
+        raise ValueError("Streaming and incremental modes cannot be combined.")
+    if lazy and (chunksize or incremental):
+        raise ValueError("Lazy mode cannot be combined with streaming or incremental mode.")
+
+    profile = PROFILE if profile is None else profile
+    checkpoint = CHECKPOINTS if checkpoint is None else checkpoint
+    profiler = cProfile.Profile() if profile else None
+    if profile:
+        tracemalloc.start()
+        profiler.enable()
+
+    try:
+        run_pipeline(chunksize, incremental, lazy, checkpoint)
+    finally:
+        if profile:
+            profiler.disable()
+            profiler.dump_stats(PROFILE_PATH)
+            tracemalloc.stop()
+        flush_metrics()
+        stop_log_writer()
+
+
+def run_pipeline(chunksize=None, incremental=False, lazy=False, checkpoint=False):
+    log("ETL started")
+
+    if checkpoint and not (chunksize or incremental or lazy):
+        data, extract_keys = extract_checkpointed()
+        df_final, transform_key = transform_checkpointed(data, extract_keys)
+        load_checkpointed(df_final, transform_key)
+        log("ETL finished")
+        final_validation(df_final)
+        return
+
+    if lazy:
+        plan = lazy_transform(OUTPUT_COLUMNS, OUTPUT_FILTERS)
+        load_all(plan)
+        log("ETL finished")
+        final_validation(plan)
+        return
+
+    sources = dict(EXTRACT_SOURCES)
+    if incremental and os.path.exists(previous_output_path()):
+        # The API has no watermark: only the first (full) incremental run reads it
+        sources.pop("api", None)
+
+    data = extract_all(sources=sources, chunksize=chunksize)
+    if incremental:
+        df_final, new_state = transform_incremental(data, load_state())
+    else:
+        df_final = transform_all(data)
+    load_all(df_final)
+
+    if incremental:
+        save_state(new_state)
+
+    log("ETL finished")
+    final_validation(df_final)
 
 
 # 7. FINAL (MANUAL) VALIDATION
@@ -195,3 +2621,17 @@
 # - Verify that the output files exist
 #
 # This part can go inside main() or separately.
+
+def final_validation(df_final):
+    if isinstance(df_final, pd.DataFrame):
+        print("Final shape:", df_final.shape)
+        print("Columns:", list(df_final.columns))
+        print(df_final.head())
+
+    for filename in ["final_users.csv", "final_users.json"]:
+        path = os.path.join(OUTPUT_DIR, filename)
+        print(path, "exists:", os.path.exists(path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import os
+
+import pandas as pd
+import pytest
+
+import final_project as fp
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def df_final(tmp_path, monkeypatch):
+    monkeypatch.chdir(REPO_ROOT)
+    monkeypatch.setattr(fp, "DEDUP_INDEX_PATH", str(tmp_path / "dedup_index.sqlite"))
+    monkeypatch.setattr(fp, "DEDUP_REPORT_PATH", str(tmp_path / "dedup_report.csv"))
+    monkeypatch.setattr(fp, "LOG_FILE", str(tmp_path / "etl_log.txt"))
+    monkeypatch.setattr(fp, "METRICS_PATH", str(tmp_path / "etl_metrics.jsonl"))
+    # API rows have no country and no signup date, so both partition keys
+    # get a __HIVE_DEFAULT_PARTITION__ folder
+    api = pd.DataFrame({
+        "id": [101, 102],
+        "firstName": ["Zoe", "Ana"],
+        "lastName": ["Quinn", "Gil"],
+        "email": ["zoe.quinn@example.com", "ana.gil@example.com"],
+        "age": [70, 23],
+    })
+    data = {"csv": fp.extract_csv(fp.CSV_PATH), "json": fp.extract_json(fp.JSON_PATH), "api": api}
+    yield fp.transform_all(data)
+    fp.stop_log_writer()
+
+
+def sort_rows(df):
+    return df[fp.FINAL_COLUMNS].sort_values("user_id").reset_index(drop=True)
+
+
+@pytest.mark.parametrize("partition_by", [None, "country", "signup_year"])
+def test_parquet_round_trip(df_final, tmp_path, partition_by):
+    path = str(tmp_path / "final_users.parquet")
+    fp.save_parquet(df_final, path, partition_by)
+
+    df_read = fp.extract_parquet(path)
+    if partition_by == "signup_year":
+        years = pd.to_datetime(df_final["signup_date"]).dt.year.astype("Int64")
+        assert df_read["signup_year"].isna().sum() == years.isna().sum() > 0
+    pd.testing.assert_frame_equal(
+        fp.cast_final_dtypes(sort_rows(df_read)), sort_rows(df_final))
+
+
+def test_parquet_filter_on_partition(df_final, tmp_path):
+    path = str(tmp_path / "final_users.parquet")
+    fp.save_parquet(df_final, path, "signup_year")
+
+    df_read = fp.extract_parquet(path, filters=[("signup_year", "==", 2021)])
+    expected = df_final[pd.to_datetime(df_final["signup_date"]).dt.year == 2021]
+    assert len(df_read) == len(expected) > 0
+
+
+@pytest.mark.parametrize("partition_by", [None, "country"])
+def test_failed_writer_leaves_no_temp_output(df_final, tmp_path, monkeypatch, partition_by):
+    def broken_writer(df, path, partition_by=None):
+        fp.save_parquet(df, path, partition_by)
+        raise OSError("disk full")
+
+    monkeypatch.setitem(fp.WRITERS, "parquet", broken_writer)
+    with pytest.raises(OSError):
+        fp.write_format(df_final, "parquet", str(tmp_path / "final_users.parquet"), partition_by)
+    assert os.listdir(tmp_path) == []
+
+
+def test_streaming_excel_matches_pandas_excel(df_final, tmp_path, monkeypatch):
+    monkeypatch.setattr(fp, "OUTPUT_DIR", str(tmp_path / "pandas"))
+    fp.load_all(df_final, excel=True, parallel=False)
+    monkeypatch.setattr(fp, "OUTPUT_DIR", str(tmp_path / "streaming"))
+    fp.load_all(df_final, excel=True, parallel=False, excel_mode="streaming")
+
+    expected = pd.read_excel(tmp_path / "pandas" / "final_users.xlsx")
+    pd.testing.assert_frame_equal(pd.read_excel(tmp_path / "streaming" / "final_users.xlsx"), expected)
+
+
+def test_streaming_excel_splits_full_sheets(df_final, tmp_path):
+    path = str(tmp_path / "final_users.xlsx")
+    # 4 rows per sheet, header included
+    sheets = fp.write_excel_streaming(df_final, path, sheet_name="Users", max_rows=5)
+
+    workbook = pd.read_excel(path, sheet_name=None)
+    assert sheets == len(workbook) == -(-len(df_final) // 4)
+    assert list(workbook)[:2] == ["Users", "Users_2"]
+    assert sum(len(df) for df in workbook.values()) == len(df_final)
@@ -0,0 +1,101 @@
+import os
+import shutil
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import final_project as fp
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(REPO_ROOT)
+    monkeypatch.setattr(fp, "OUTPUT_DIR", str(tmp_path / "output"))
+    monkeypatch.setattr(fp, "DEDUP_INDEX_PATH", str(tmp_path / "output" / "dedup_index.sqlite"))
+    monkeypatch.setattr(fp, "DEDUP_REPORT_PATH", str(tmp_path / "output" / "dedup_report.csv"))
+    monkeypatch.setattr(fp, "LOG_FILE", str(tmp_path / "etl_log.txt"))
+    monkeypatch.setattr(fp, "METRICS_PATH", str(tmp_path / "etl_metrics.jsonl"))
+    yield tmp_path
+    fp.stop_log_writer()
+
+
+def read_sources(csv_path):
+    return {"csv": fp.extract_csv(csv_path), "json": fp.extract_json(fp.JSON_PATH)}
+
+
+def run_incremental(csv_path, state):
+    df_final, new_state = fp.transform_incremental(read_sources(csv_path), state)
+    fp.ensure_output_dir()
+    fp.save_csv(df_final, os.path.join(fp.OUTPUT_DIR, "final_users.csv"))
+    return df_final, new_state
+
+
+def assert_same_as_full_run(df_incremental, csv_path):
+    # New rows come first in an incremental run, so compare in user_id order
+    df_full = fp.transform_all(read_sources(csv_path))
+    pd.testing.assert_frame_equal(
+        df_incremental.sort_values("user_id").reset_index(drop=True),
+        df_full.sort_values("user_id").reset_index(drop=True),
+    )
+
+
+def test_row_on_watermark_date_is_not_skipped(workdir):
+    csv_path = str(workdir / "users.csv")
+    shutil.copy(fp.CSV_PATH, csv_path)
+
+    df_first, state = run_incremental(csv_path, {})
+    assert state["csv"].startswith("2024-02-10")
+
+    with open(csv_path, "a", encoding="utf-8") as f:
+        f.write("11,Laura,Vidal,laura.vidal@example.com,29,Spain,2024-02-10,True\n")
+        f.write("12,Hugo,Marín,hugo.marin@example.com,35,Spain,2024-02-11,True\n")
+
+    df_second, state = run_incremental(csv_path, state)
+    assert {"laura.vidal@example.com", "hugo.marin@example.com"} <= set(df_second["email"])
+    assert len(df_second) == len(df_first) + 2
+    assert state["csv"].startswith("2024-02-11")
+    assert_same_as_full_run(df_second, csv_path)
+
+
+def test_rerun_without_new_rows_keeps_the_output(workdir):
+    csv_path = str(workdir / "users.csv")
+    shutil.copy(fp.CSV_PATH, csv_path)
+    output_path = os.path.join(fp.OUTPUT_DIR, "final_users.csv")
+
+    df_first, state = run_incremental(csv_path, {})
+    with open(output_path, encoding="utf-8") as f:
+        first_csv = f.read()
+
+    # Only the row on the watermark date (without email) is read again
+    df_second, _ = run_incremental(csv_path, state)
+    pd.testing.assert_frame_equal(df_second, df_first)
+    assert_same_as_full_run(df_second, csv_path)
+    with open(output_path, encoding="utf-8") as f:
+        assert f.read() == first_csv
+
+
+def test_updated_row_replaces_previous_row_through_the_index(workdir):
+    csv_path = str(workdir / "users.csv")
+    shutil.copy(fp.CSV_PATH, csv_path)
+
+    df_first, state = run_incremental(csv_path, {})
+    with open(csv_path, "a", encoding="utf-8") as f:
+        f.write("3,Lucía,Martínez,lucia.m@example.com,28,Spain,2024-02-12,True\n")
+
+    df_second, state = run_incremental(csv_path, state)
+    user = df_second[df_second["user_id"] == 3]
+    assert user["email"].tolist() == ["lucia.m@example.com"]
+    assert len(df_second) == len(df_first)
+
+    report = pd.read_csv(fp.DEDUP_REPORT_PATH)
+    assert "lucia.martinez@example.com" in set(report["email"])
+
+    with sqlite3.connect(fp.DEDUP_INDEX_PATH) as index:
+        runs = index.execute("SELECT run_id, mode FROM dedup_runs ORDER BY run_id").fetchall()
+        owners = index.execute("SELECT DISTINCT source, user_id FROM dedup_keys").fetchall()
+    assert [mode for _, mode in runs] == ["full", "incremental"]
+    assert state["dedup_run"] == runs[-1][0]
+    assert len(owners) == len(df_second)
@@ -0,0 +1,40 @@
+import json
+import tracemalloc
+
+import pytest
+
+import final_project as fp
+
+
+@pytest.fixture
+def metrics(tmp_path, monkeypatch):
+    path = tmp_path / "etl_metrics.jsonl"
+    monkeypatch.setattr(fp, "METRICS_PATH", str(path))
+    # Metrics go to the file that was open when the first record was written
+    fp.flush_metrics()
+    tracemalloc.start()
+    yield path
+    tracemalloc.stop()
+
+
+def read_metrics(path):
+    fp.flush_metrics()
+    with open(path, encoding="utf-8") as f:
+        return {record["stage"]: record for record in map(json.loads, f)}
+
+
+def test_inner_stage_does_not_hide_the_outer_peak(metrics):
+    @fp.instrument("inner")
+    def inner():
+        return bytearray(1024)
+
+    @fp.instrument("outer")
+    def outer():
+        block = bytearray(20 * 1024 * 1024)
+        del block
+        return inner()
+
+    outer()
+    records = read_metrics(metrics)
+    assert records["inner"]["peak_traced_mb"] < 1
+    assert records["outer"]["peak_traced_mb"] >= 20
@@ -0,0 +1,32 @@
+import multiprocessing
+
+import pandas as pd
+import pytest
+
+import final_project as fp
+
+pytestmark = pytest.mark.skipif(
+    fp.pa is None or "fork" not in multiprocessing.get_all_start_methods(),
+    reason="partitioned enrich needs pyarrow and fork",
+)
+
+
+@pytest.fixture
+def df_users(tmp_path, monkeypatch):
+    monkeypatch.setattr(fp, "LOG_FILE", str(tmp_path / "etl_log.txt"))
+    monkeypatch.setattr(fp, "METRICS_PATH", str(tmp_path / "etl_metrics.jsonl"))
+    df = fp.extract_csv(fp.CSV_PATH)
+    yield pd.concat([df] * 300, ignore_index=True)
+    fp.stop_log_writer()
+
+
+@pytest.mark.parametrize("by", ["rows", "user_id"])
+def test_partitioned_enrich_equals_serial_enrich(df_users, by):
+    pd.testing.assert_frame_equal(fp.enrich(df_users), fp.enrich_partitioned(df_users, 4, by))
+
+
+def test_partition_with_only_null_ages_keeps_the_serial_dtypes(df_users):
+    # With contiguous row ranges the last part only gets null ages
+    df = df_users.assign(age=df_users["age"].astype("Float64"))
+    df.loc[len(df) * 3 // 4:, "age"] = pd.NA
+    pd.testing.assert_frame_equal(fp.enrich(df), fp.enrich_partitioned(df, 4, "rows"))
@@ -0,0 +1,53 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import final_project as fp
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(REPO_ROOT)
+    monkeypatch.setattr(fp, "OUTPUT_DIR", str(tmp_path / "output"))
+    monkeypatch.setattr(fp, "DEDUP_INDEX_PATH", str(tmp_path / "output" / "dedup_index.sqlite"))
+    monkeypatch.setattr(fp, "DEDUP_REPORT_PATH", str(tmp_path / "output" / "dedup_report.csv"))
+    monkeypatch.setattr(fp, "LOG_FILE", str(tmp_path / "etl_log.txt"))
+    monkeypatch.setattr(fp, "METRICS_PATH", str(tmp_path / "etl_metrics.jsonl"))
+    monkeypatch.setattr(fp, "VALIDATION_MODE", "full")
+
+    csv_path = tmp_path / "users.csv"
+    shutil.copy(fp.CSV_PATH, csv_path)
+    with open(csv_path, "a", encoding="utf-8") as f:
+        f.write("11,Rosa,Vega,rosa.vega@example.com,abc,Spain,2023-03-01,True\n")
+    yield str(csv_path)
+    fp.stop_log_writer()
+
+
+def read_quarantine():
+    df = pd.read_csv(os.path.join(fp.OUTPUT_DIR, "quarantine.csv"))
+    return dict(zip(df["user_id"], df["failed_checks"]))
+
+
+def test_full_mode_quarantines_rows_that_enrich_would_coerce_or_drop(workdir):
+    data = {"csv": fp.extract_csv(workdir), "json": fp.extract_json(fp.JSON_PATH)}
+    df_final = fp.transform_all(data)
+
+    quarantined = read_quarantine()
+    # user 9 has no email, user 11 has age "abc"
+    assert quarantined[9] == "email_missing"
+    assert quarantined[11] == "age_not_numeric"
+    assert not df_final["user_id"].isin([9, 11]).any()
+    assert fp.INVALID_COLUMN not in df_final.columns
+
+
+def test_streaming_mode_quarantines_the_same_rows(workdir):
+    data = {"csv": fp.extract_csv_chunks(workdir, chunksize=4), "json": fp.extract_json(fp.JSON_PATH)}
+    df_final = pd.concat(list(fp.transform_all(data)), ignore_index=True)
+
+    quarantined = read_quarantine()
+    assert quarantined == {9: "email_missing", 11: "age_not_numeric"}
+    assert not df_final["user_id"].isin([9, 11]).any()